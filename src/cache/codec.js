@@ -0,0 +1,114 @@
+// Binary encoding of cached values. Every stored value is one header byte
+// naming the compression used, followed by the (possibly compressed) JSON.
+// Any configured codec can read values written by any other.
+//
+// When the header's FRESHNESS_FLAG bit is set, a 4-byte big-endian "fresh
+// until" time in epoch seconds sits between the header and the body.
+
+const zlib = require('zlib');
+const { promisify } = require('util');
+
+const gzip = promisify(zlib.gzip);
+const gunzip = promisify(zlib.gunzip);
+const deflateRaw = promisify(zlib.deflateRaw);
+const inflateRaw = promisify(zlib.inflateRaw);
+const brotliCompress = promisify(zlib.brotliCompress);
+const brotliDecompress = promisify(zlib.brotliDecompress);
+
+// Brotli's default quality (11) is far too slow to run on every cache write
+const BROTLI_QUALITY = 5;
+
+// Each codec only pays off above a size that covers its framing and CPU cost
+const CODECS = {
+    identity: {
+        id: 0,
+        minSize: Infinity,
+        encode: async (buffer) => buffer,
+        decode: async (buffer) => buffer,
+    },
+    gzip: {
+        id: 1,
+        minSize: 1024,
+        encode: (buffer) => gzip(buffer),
+        decode: (buffer) => gunzip(buffer),
+    },
+    'deflate-raw': {
+        id: 2,
+        minSize: 512,
+        encode: (buffer) => deflateRaw(buffer),
+        decode: (buffer) => inflateRaw(buffer),
+    },
+    brotli: {
+        id: 3,
+        minSize: 2048,
+        encode: (buffer) => brotliCompress(buffer, {
+            params: { [zlib.constants.BROTLI_PARAM_QUALITY]: BROTLI_QUALITY },
+        }),
+        decode: (buffer) => brotliDecompress(buffer),
+    },
+};
+
+const FRESHNESS_FLAG = 0x80;
+const FRESHNESS_BYTES = 4;
+
+const CODECS_BY_ID = new Map(Object.values(CODECS).map((codec) => [codec.id, codec]));
+
+// Values written as strings before the binary format ('j:' JSON, 'z:' base64 gzip)
+async function decodeLegacy(buffer) {
+    const data = buffer.toString();
+    if (data.startsWith('z:')) return gunzip(Buffer.from(data.slice(2), 'base64'));
+    if (data.startsWith('j:')) return Buffer.from(data.slice(2));
+    return buffer;
+}
+
+function createCodec({ name = 'gzip', minSize } = {}) {
+    const codec = CODECS[name];
+    if (!codec) {
+        throw new Error(`Unknown cache codec '${name}', expected one of ${Object.keys(CODECS).join(', ')}`);
+    }
+    const threshold = minSize ?? codec.minSize;
+
+    return {
+        name,
+
+        // JSON buffer -> stored value, optionally stamped with a fresh-until time (ms)
+        async encode(buffer, { freshUntil } = {}) {
+            const chosen = buffer.length > threshold ? codec : CODECS.identity;
+            const body = await chosen.encode(buffer);
+            if (freshUntil === undefined) {
+                return Buffer.concat([Buffer.from([chosen.id]), body]);
+            }
+
+            const header = Buffer.alloc(1 + FRESHNESS_BYTES);
+            header.writeUInt8(chosen.id | FRESHNESS_FLAG, 0);
+            header.writeUInt32BE(Math.ceil(freshUntil / 1000), 1);
+            return Buffer.concat([header, body]);
+        },
+
+        // stored value -> { buffer, freshUntil, compressed }; freshUntil is null when unstamped
+        async decodeEntry(value) {
+            const header = value[0];
+            const stamped = header !== undefined && (header & FRESHNESS_FLAG) !== 0;
+            const stored = CODECS_BY_ID.get(stamped ? header & ~FRESHNESS_FLAG : header);
+            if (!stored) return { buffer: await decodeLegacy(value), freshUntil: null, compressed: false };
+
+            const compressed = stored !== CODECS.identity;
+            if (!stamped) return { buffer: await stored.decode(value.subarray(1)), freshUntil: null, compressed };
+            return {
+                buffer: await stored.decode(value.subarray(1 + FRESHNESS_BYTES)),
+                freshUntil: value.readUInt32BE(1) * 1000,
+                compressed,
+            };
+        },
+
+        // stored value -> JSON buffer
+        async decode(value) {
+            return (await this.decodeEntry(value)).buffer;
+        },
+    };
+}
+
+module.exports = {
+    CODECS,
+    createCodec,
+};
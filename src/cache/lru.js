@@ -0,0 +1,65 @@
+// In-process LRU cache for serialized values, bounded by entry count and by
+// total bytes. A Map keeps insertion order, so re-inserting on access moves an
+// entry to the most recently used end and the first key is always the oldest.
+
+function createLru({ maxEntries, maxBytes }) {
+    const entries = new Map();
+    let bytes = 0;
+    let hits = 0;
+    let misses = 0;
+
+    const sizeOf = (key, value) => Buffer.byteLength(key) + value.length;
+
+    function remove(key) {
+        const entry = entries.get(key);
+        if (!entry) return;
+        bytes -= entry.size;
+        entries.delete(key);
+    }
+
+    function evict() {
+        while (entries.size > maxEntries || bytes > maxBytes) {
+            remove(entries.keys().next().value);
+        }
+    }
+
+    return {
+        get(key) {
+            const entry = entries.get(key);
+            if (!entry || entry.expiresAt <= Date.now()) {
+                if (entry) remove(key);
+                misses += 1;
+                return null;
+            }
+            entries.delete(key);
+            entries.set(key, entry);
+            hits += 1;
+            return entry.value;
+        },
+
+        // value is a Buffer; ttl in seconds
+        set(key, value, ttl) {
+            remove(key);
+            const size = sizeOf(key, value);
+            if (size > maxBytes) return;
+            entries.set(key, { value, size, expiresAt: Date.now() + ttl * 1000 });
+            bytes += size;
+            evict();
+        },
+
+        delete: remove,
+
+        clear() {
+            entries.clear();
+            bytes = 0;
+        },
+
+        stats() {
+            return {
+                entries: entries.size, bytes, hits, misses,
+            };
+        },
+    };
+}
+
+module.exports = { createLru };
@@ -0,0 +1,30 @@
+// Collapse concurrent calls for the same key into one execution. Callers that
+// arrive while a call is in flight share its promise instead of starting
+// their own, e.g. identical searches after a cache entry expires.
+
+function createSingleFlight() {
+    const inFlight = new Map();
+    let shared = 0;
+
+    return {
+        run(key, fn) {
+            const pending = inFlight.get(key);
+            if (pending) {
+                shared += 1;
+                return pending;
+            }
+
+            const promise = Promise.resolve()
+                .then(fn)
+                .finally(() => inFlight.delete(key));
+            inFlight.set(key, promise);
+            return promise;
+        },
+
+        stats() {
+            return { inFlight: inFlight.size, shared };
+        },
+    };
+}
+
+module.exports = { createSingleFlight };
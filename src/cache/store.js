@@ -0,0 +1,251 @@
+// Two-tier cache for serialized search results: an in-process LRU in front of
+// Redis. Keys carry the catalog generation, so bumping it after a catalog
+// change orphans every older entry at once and they age out of Redis on
+// their own. Redis failures are logged and treated as misses.
+
+const metrics = require('../metrics');
+
+// Empty results are stored as this single byte rather than an encoded '[]'
+const NEGATIVE_SENTINEL = Buffer.from([0xff]);
+const EMPTY_RESULT = Buffer.from('[]');
+
+// Record how long a Redis command took, for /metrics
+function redisCommand(command, promise) {
+    return metrics.timed(metrics.redisCommandDuration, { command }, promise);
+}
+
+// config is the server's CACHE_CONFIG; localCache an lru, codec a cache codec
+function createCacheStore({
+    redis,
+    config,
+    localCache,
+    codec,
+    log = () => {},
+}) {
+    const generationKey = `${config.PREFIX}${config.GENERATION_KEY}`;
+    const queryStatsKey = `${config.PREFIX}${config.QUERY_STATS_KEY}`;
+
+    // Current catalog generation, mirrored from Redis
+    let catalogGeneration = 0;
+    // Queries recorded since the ranking was last trimmed
+    let queriesSinceTrim = 0;
+
+    function generateKey(category, identifier) {
+        return `${config.PREFIX}${category}g${catalogGeneration}:${identifier}`;
+    }
+
+    // Drop the in-process tier, e.g. after the catalog changed
+    function clearLocal() {
+        localCache.clear();
+        log('debug', 'Local cache cleared');
+    }
+
+    // Never moves backwards; a generation bumped locally while Redis was down
+    // is written back so other processes and the next INCR start above it
+    async function loadGeneration() {
+        try {
+            const stored = parseInt(await redisCommand('get', redis.get(generationKey)), 10) || 0;
+            if (catalogGeneration > stored) {
+                await redisCommand('set', redis.set(generationKey, catalogGeneration));
+            } else {
+                catalogGeneration = stored;
+            }
+            log('debug', `Catalog generation: ${catalogGeneration}`);
+        } catch (error) {
+            log('error', 'Error loading catalog generation:', error);
+        }
+    }
+
+    // Make every cached entry from before a catalog change unreachable. Always
+    // moves past the generation in use, even if Redis is behind it.
+    async function bumpGeneration() {
+        try {
+            const bumped = await redisCommand('incr', redis.incr(generationKey));
+            catalogGeneration = Math.max(bumped, catalogGeneration + 1);
+            if (catalogGeneration > bumped) {
+                await redisCommand('set', redis.set(generationKey, catalogGeneration));
+            }
+        } catch (error) {
+            // Keep old entries unreachable from this process until Redis is back
+            catalogGeneration += 1;
+            log('warn', 'Error bumping catalog generation in Redis:', error);
+        }
+        clearLocal();
+        log('info', `Catalog generation is now ${catalogGeneration}`);
+    }
+
+    // ttl is the soft TTL; the value stays in Redis, stale, until hardTtl
+    async function set(key, data, ttl = config.DEFAULT_TTL, hardTtl = Math.max(config.HARD_TTL, ttl)) {
+        try {
+            if (Array.isArray(data) && data.length === 0) {
+                // Negative entry: short TTL, no stale window
+                localCache.set(key, EMPTY_RESULT, Math.min(config.NEGATIVE_TTL, config.LOCAL.TTL));
+                await redisCommand('setex', redis.setex(key, config.NEGATIVE_TTL, NEGATIVE_SENTINEL));
+                log('debug', `Cache set (negative): ${key}`);
+                return;
+            }
+
+            const buffer = Buffer.from(JSON.stringify(data));
+            localCache.set(key, buffer, Math.min(ttl, config.LOCAL.TTL));
+
+            const freshUntil = Date.now() + ttl * 1000;
+            const value = await codec.encode(buffer, { freshUntil });
+            await redisCommand('setex', redis.setex(key, hardTtl, value));
+            log('debug', `Cache set: ${key}`);
+        } catch (error) {
+            log('error', `Cache set error for key ${key}:`, error);
+        }
+    }
+
+    // { buffer, stale } for key, from the local tier when possible. buffer holds
+    // serialized JSON; stale means the soft TTL has passed.
+    async function getEntry(key) {
+        const local = localCache.get(key);
+        if (local) {
+            metrics.cacheRequests.inc({ tier: 'local', result: 'hit' });
+            return { buffer: local, stale: false };
+        }
+        metrics.cacheRequests.inc({ tier: 'local', result: 'miss' });
+
+        try {
+            const data = await redisCommand('get', redis.getBuffer(key));
+            if (!data) {
+                metrics.cacheRequests.inc({ tier: 'redis', result: 'miss' });
+                return null;
+            }
+            if (data.equals(NEGATIVE_SENTINEL)) {
+                metrics.cacheRequests.inc({ tier: 'redis', result: 'negative_hit' });
+                return { buffer: EMPTY_RESULT, stale: false };
+            }
+
+            const { buffer, freshUntil, compressed } = await codec.decodeEntry(data);
+            if (compressed) {
+                metrics.cacheCompressedHits.inc();
+            }
+            const freshFor = freshUntil === null ? config.LOCAL.TTL : (freshUntil - Date.now()) / 1000;
+            if (freshFor <= 0) {
+                metrics.cacheRequests.inc({ tier: 'redis', result: 'stale_hit' });
+                return { buffer, stale: true };
+            }
+
+            metrics.cacheRequests.inc({ tier: 'redis', result: 'hit' });
+            localCache.set(key, buffer, Math.min(freshFor, config.LOCAL.TTL));
+            return { buffer, stale: false };
+        } catch (error) {
+            metrics.cacheRequests.inc({ tier: 'redis', result: 'error' });
+            log('error', `Cache get error for key ${key}:`, error);
+            return null;
+        }
+    }
+
+    // Serialized JSON for key, stale or not
+    async function getBuffer(key) {
+        const entry = await getEntry(key);
+        return entry ? entry.buffer : null;
+    }
+
+    async function get(key) {
+        const buffer = await getBuffer(key);
+        if (!buffer) {
+            return null;
+        }
+        try {
+            return JSON.parse(buffer.toString());
+        } catch (error) {
+            log('error', `Cache get error for key ${key}:`, error);
+            return null;
+        }
+    }
+
+    async function invalidate(key) {
+        try {
+            localCache.delete(key);
+            await redisCommand('del', redis.del(key));
+            log('debug', `Cache invalidated: ${key}`);
+        } catch (error) {
+            log('error', `Cache invalidation error for key ${key}:`, error);
+        }
+    }
+
+    // Remember which products a cached search holds, so a stock change can drop
+    // just the entries that show it. One pipelined round-trip per search.
+    async function trackProducts(key, rows, ttl = config.HARD_TTL) {
+        if (!rows.length) {
+            return;
+        }
+        try {
+            const pipeline = redis.pipeline();
+            rows.forEach((row) => {
+                const refKey = generateKey(config.CATEGORIES.PRODUCT_REFS, row.id);
+                pipeline.sadd(refKey, key);
+                pipeline.expire(refKey, ttl);
+            });
+            await redisCommand('pipeline', pipeline.exec());
+        } catch (error) {
+            log('error', `Error tracking products for key ${key}:`, error);
+        }
+    }
+
+    // Drop every cached search holding one of these products; returns how many
+    async function invalidateProducts(productIds) {
+        let dropped = 0;
+        try {
+            for (let start = 0; start < productIds.length; start += config.INVALIDATE_BATCH_SIZE) {
+                const refKeys = productIds
+                    .slice(start, start + config.INVALIDATE_BATCH_SIZE)
+                    .map((id) => generateKey(config.CATEGORIES.PRODUCT_REFS, id));
+                const keys = await redisCommand('sunion', redis.sunion(...refKeys));
+                keys.forEach((key) => localCache.delete(key));
+                await redisCommand('del', redis.del(...keys, ...refKeys));
+                dropped += keys.length;
+            }
+            log('debug', `Cache invalidated ${dropped} entries for ${productIds.length} products`);
+        } catch (error) {
+            // Entries left behind still expire at the soft TTL
+            log('error', 'Error invalidating cached searches for products:', error);
+        }
+        return dropped;
+    }
+
+    // Count a search towards the pre-warm ranking. Every TRIM_EVERY counts the
+    // least frequent queries beyond MAX_TRACKED_QUERIES are dropped in the same
+    // round-trip, so the ranking stays bounded between warms. Errors are only
+    // logged; callers need not wait for it.
+    function recordQuery(query) {
+        const pipeline = redis.pipeline().zincrby(queryStatsKey, 1, query);
+        queriesSinceTrim += 1;
+        if (queriesSinceTrim >= config.WARM.TRIM_EVERY) {
+            queriesSinceTrim = 0;
+            pipeline.zremrangebyrank(queryStatsKey, 0, -(config.WARM.MAX_TRACKED_QUERIES + 1));
+        }
+        return redisCommand('pipeline', pipeline.exec())
+            .catch((error) => log('error', 'Error recording search query:', error));
+    }
+
+    // Most frequent queries first
+    function topQueries(limit) {
+        return redisCommand('zrevrange', redis.zrevrange(queryStatsKey, 0, limit - 1));
+    }
+
+    return {
+        generateKey,
+        generation: () => catalogGeneration,
+        loadGeneration,
+        bumpGeneration,
+        set,
+        getEntry,
+        getBuffer,
+        get,
+        invalidate,
+        trackProducts,
+        invalidateProducts,
+        clearLocal,
+        recordQuery,
+        topQueries,
+    };
+}
+
+module.exports = {
+    NEGATIVE_SENTINEL,
+    createCacheStore,
+};
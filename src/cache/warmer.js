@@ -0,0 +1,48 @@
+// Re-run the most frequent searches one at a time so the cache is hot after
+// a restart or a catalog change. A warm requested while one is running is
+// skipped; the running one already covers the current catalog.
+
+const pause = (ms) => new Promise((resolve) => {
+    setTimeout(resolve, ms);
+});
+
+// store is a cache store; refresh(query) runs a search and caches it
+function createCacheWarmer({
+    store,
+    refresh,
+    topQueries,
+    delayMs = 0,
+    log = () => {},
+}) {
+    let warming = false;
+
+    // Resolves with how many searches were warmed; never rejects
+    async function warm() {
+        if (warming) {
+            return 0;
+        }
+        warming = true;
+        try {
+            const queries = await store.topQueries(topQueries);
+            // One at a time, pausing in between, so live searches go first
+            for (const query of queries) {
+                await refresh(query);
+                await pause(delayMs);
+            }
+            log('info', `Cache warmed with ${queries.length} searches`);
+            return queries.length;
+        } catch (error) {
+            log('error', 'Error warming search cache:', error);
+            return 0;
+        } finally {
+            warming = false;
+        }
+    }
+
+    return {
+        warm,
+        isWarming: () => warming,
+    };
+}
+
+module.exports = { createCacheWarmer };
@@ -0,0 +1,117 @@
+// Connection tuning applied right after the database is opened. WAL lets
+// searches keep reading the last committed catalog while a sync holds its
+// write transaction; the rest trades a little durability on power loss
+// (never corruption) for far fewer fsyncs and more of the file in memory.
+
+const JOURNAL_MODES = ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'];
+const SYNCHRONOUS_MODES = ['OFF', 'NORMAL', 'FULL', 'EXTRA']; // PRAGMA synchronous reports the index
+const TEMP_STORES = ['DEFAULT', 'FILE', 'MEMORY']; // PRAGMA temp_store reports the index
+
+const DEFAULTS = {
+    journalMode: 'WAL',
+    synchronous: 'NORMAL',
+    mmapSize: 256 * 1024 * 1024, // Bytes of the file read through mmap
+    cacheSize: -64 * 1024, // Negative means KiB, i.e. a 64MB page cache
+    tempStore: 'MEMORY',
+    busyTimeout: 5000, // ms to wait on a lock before SQLITE_BUSY
+};
+
+function oneOf(value, allowed, name) {
+    const upper = String(value).toUpperCase();
+    if (!allowed.includes(upper)) {
+        throw new Error(`Invalid ${name} '${value}', expected one of ${allowed.join(', ')}`);
+    }
+    return upper;
+}
+
+function integer(value, name) {
+    const parsed = Number(value);
+    if (!Number.isInteger(parsed)) {
+        throw new Error(`Invalid ${name} '${value}', expected an integer`);
+    }
+    return parsed;
+}
+
+// Settings from SQLITE_* environment variables, falling back to DEFAULTS
+function settingsFromEnv(env = process.env) {
+    const pick = (key, fallback) => (env[key] === undefined || env[key] === '' ? fallback : env[key]);
+    return {
+        journalMode: oneOf(pick('SQLITE_JOURNAL_MODE', DEFAULTS.journalMode), JOURNAL_MODES, 'SQLITE_JOURNAL_MODE'),
+        synchronous: oneOf(pick('SQLITE_SYNCHRONOUS', DEFAULTS.synchronous), SYNCHRONOUS_MODES, 'SQLITE_SYNCHRONOUS'),
+        mmapSize: integer(pick('SQLITE_MMAP_SIZE', DEFAULTS.mmapSize), 'SQLITE_MMAP_SIZE'),
+        cacheSize: integer(pick('SQLITE_CACHE_SIZE', DEFAULTS.cacheSize), 'SQLITE_CACHE_SIZE'),
+        tempStore: oneOf(pick('SQLITE_TEMP_STORE', DEFAULTS.tempStore), TEMP_STORES, 'SQLITE_TEMP_STORE'),
+        busyTimeout: integer(pick('SQLITE_BUSY_TIMEOUT', DEFAULTS.busyTimeout), 'SQLITE_BUSY_TIMEOUT'),
+    };
+}
+
+// busy_timeout goes first so the journal mode switch itself can wait for a lock
+function pragmaStatements(settings) {
+    return [
+        `PRAGMA busy_timeout = ${settings.busyTimeout}`,
+        `PRAGMA journal_mode = ${settings.journalMode}`,
+        `PRAGMA synchronous = ${settings.synchronous}`,
+        `PRAGMA mmap_size = ${settings.mmapSize}`,
+        `PRAGMA cache_size = ${settings.cacheSize}`,
+        `PRAGMA temp_store = ${settings.tempStore}`,
+    ];
+}
+
+// Per-connection settings for read-only connections. The journal mode is a
+// property of the file and synchronous only matters to writers.
+function readerPragmaStatements(settings) {
+    return pragmaStatements(settings)
+        .filter((sql) => !/^PRAGMA (journal_mode|synchronous) /.test(sql));
+}
+
+// First value of the row a PRAGMA statement returns, if any
+function queryPragma(db, sql) {
+    return new Promise((resolve, reject) => {
+        db.get(sql, [], (err, row) => {
+            if (err) {
+                reject(err);
+                return;
+            }
+            // Some pragmas (mmap_size with mmap disabled at compile time) return no row
+            resolve(row ? Object.values(row)[0] : null);
+        });
+    });
+}
+
+// Settings as SQLite reports them, in the same shape as settingsFromEnv()
+async function effectiveSettings(db) {
+    const getPragma = (name) => queryPragma(db, `PRAGMA ${name}`);
+    return {
+        journalMode: String(await getPragma('journal_mode')).toUpperCase(),
+        synchronous: SYNCHRONOUS_MODES[await getPragma('synchronous')],
+        mmapSize: await getPragma('mmap_size'),
+        cacheSize: await getPragma('cache_size'),
+        tempStore: TEMP_STORES[await getPragma('temp_store')],
+        busyTimeout: await getPragma('busy_timeout'),
+    };
+}
+
+// Apply settings and return what actually took effect. SQLite silently keeps
+// the old value for some of them (no WAL on a read-only or network
+// filesystem, mmap_size capped at compile time), so compare before trusting.
+async function applyPragmas(db, settings = settingsFromEnv()) {
+    for (const sql of pragmaStatements(settings)) {
+        await queryPragma(db, sql);
+    }
+    return effectiveSettings(db);
+}
+
+// Names of settings that did not take effect
+function mismatches(requested, effective) {
+    return Object.keys(requested).filter((key) => requested[key] !== effective[key]);
+}
+
+module.exports = {
+    DEFAULTS,
+    settingsFromEnv,
+    pragmaStatements,
+    readerPragmaStatements,
+    applyPragmas,
+    effectiveSettings,
+    mismatches,
+};
@@ -0,0 +1,149 @@
+const path = require('path');
+const { Worker } = require('worker_threads');
+
+const WORKER_FILE = path.join(__dirname, 'readWorker.js');
+const RESPAWN_DELAY_MS = 1000;
+const MAX_RESPAWN_DELAY_MS = 60 * 1000;
+
+function toError({ message, code }) {
+    const error = new Error(message);
+    if (code) error.code = code;
+    return error;
+}
+
+// Doubles with every start in a row that died before answering a query, so a
+// worker that cannot load at all does not respawn every second forever
+function respawnDelay(failures) {
+    return Math.min(RESPAWN_DELAY_MS * 2 ** Math.max(failures - 1, 0), MAX_RESPAWN_DELAY_MS);
+}
+
+// N read-only connections, each in its own worker thread, behind the same
+// all()/get() callback API as a sqlite3.Database. Queries go to the worker
+// with the fewest outstanding queries, so searches spread across cores
+// instead of queueing on the writer connection. With WAL, readers see the
+// last committed state while a sync is writing.
+function createReadPool({
+    file,
+    size,
+    statements = [],
+    maxStatements,
+    workerFile = WORKER_FILE,
+    log = () => {},
+    onStatementLookup = () => {},
+}) {
+    const workers = [];
+    const failures = []; // Per slot: exits since the slot last answered a query
+    let nextId = 0;
+    let closing = false;
+    let completed = 0;
+    let statementHits = 0;
+    let statementMisses = 0;
+
+    function spawn(slot) {
+        const worker = new Worker(workerFile, { workerData: { file, statements, maxStatements } });
+        const entry = { worker, pending: new Map(), alive: true };
+        workers[slot] = entry;
+        failures[slot] = failures[slot] || 0;
+
+        worker.on('message', ({
+            id, rows, cached, error,
+        }) => {
+            failures[slot] = 0;
+            const callbacks = entry.pending.get(id);
+            if (!callbacks) return;
+            entry.pending.delete(id);
+            completed += 1;
+            if (error) {
+                callbacks.reject(toError(error));
+                return;
+            }
+            if (cached) statementHits += 1;
+            else statementMisses += 1;
+            onStatementLookup(cached);
+            callbacks.resolve(rows);
+        });
+
+        worker.on('error', (error) => {
+            log('error', `SQLite read worker ${slot} failed:`, error);
+        });
+
+        worker.on('exit', (code) => {
+            // Out of selection until the respawn replaces it
+            entry.alive = false;
+            entry.pending.forEach(({ reject }) => reject(new Error(`SQLite read worker exited with code ${code}`)));
+            entry.pending.clear();
+            if (closing) return;
+            failures[slot] += 1;
+            const delay = respawnDelay(failures[slot]);
+            log('warn', `SQLite read worker ${slot} exited with code ${code}, restarting in ${delay}ms`);
+            setTimeout(() => {
+                if (!closing) spawn(slot);
+            }, delay).unref();
+        });
+    }
+
+    for (let slot = 0; slot < size; slot += 1) spawn(slot);
+
+    // Live worker with the fewest outstanding queries, or null
+    function leastBusy() {
+        return workers.reduce((best, entry) => (
+            entry.alive && (!best || entry.pending.size < best.pending.size) ? entry : best
+        ), null);
+    }
+
+    function query(method, sql, params = []) {
+        if (closing) return Promise.reject(new Error('SQLite read pool is closed'));
+        const entry = leastBusy();
+        if (!entry) return Promise.reject(new Error('No SQLite read worker is running'));
+        const id = nextId;
+        nextId += 1;
+        return new Promise((resolve, reject) => {
+            entry.pending.set(id, { resolve, reject });
+            entry.worker.postMessage({
+                id, method, sql, params,
+            });
+        });
+    }
+
+    // sqlite3.Database-style entry point: (sql, [params], callback)
+    function callbackStyle(method) {
+        return (sql, params, callback) => {
+            const cb = typeof params === 'function' ? params : callback;
+            const args = typeof params === 'function' ? [] : params;
+            query(method, sql, args).then((result) => cb(null, result), (error) => cb(error));
+        };
+    }
+
+    return {
+        size,
+        all: callbackStyle('all'),
+        get: callbackStyle('get'),
+        query,
+
+        // Whether any worker is running to take queries
+        available: () => !closing && workers.some((entry) => entry.alive),
+
+        stats() {
+            return {
+                size,
+                live: workers.filter((entry) => entry.alive).length,
+                inFlight: workers.reduce((sum, entry) => sum + entry.pending.size, 0),
+                completed,
+                statementHits,
+                statementMisses,
+            };
+        },
+
+        // Stop accepting queries and terminate the workers; outstanding
+        // queries are rejected
+        async close() {
+            closing = true;
+            await Promise.all(workers.map((entry) => entry.worker.terminate()));
+        },
+    };
+}
+
+module.exports = {
+    respawnDelay,
+    createReadPool,
+};
@@ -0,0 +1,56 @@
+// Worker thread owning one read-only SQLite connection. Receives
+// { id, method, sql, params } from src/db/readPool.js and answers
+// { id, rows, cached } or { id, error }. Statements are prepared once per
+// connection and reused, see src/db/statementCache.js.
+
+const { parentPort, workerData } = require('worker_threads');
+const sqlite3 = require('sqlite3');
+const { createStatementCache } = require('./statementCache');
+
+const { file, statements: pragmas, maxStatements } = workerData;
+
+function run(db, sql) {
+    return new Promise((resolve, reject) => {
+        db.run(sql, (err) => (err ? reject(err) : resolve()));
+    });
+}
+
+let lastLookupCached = false;
+
+// Queries wait for the connection and its pragmas; if either fails, every
+// query is answered with that error
+const opened = new Promise((resolve, reject) => {
+    const db = new sqlite3.Database(file, sqlite3.OPEN_READONLY, (err) => {
+        if (err) {
+            reject(err);
+            return;
+        }
+        pragmas
+            .reduce((previous, sql) => previous.then(() => run(db, sql)), Promise.resolve())
+            .then(() => resolve(createStatementCache(db, {
+                maxEntries: maxStatements,
+                onLookup: (hit) => {
+                    lastLookupCached = hit;
+                },
+            })), reject);
+    });
+});
+opened.catch(() => {}); // Reported per query below
+
+function serializeError(error) {
+    return { message: error.message, code: error.code };
+}
+
+parentPort.on('message', async ({
+    id, method, sql, params,
+}) => {
+    try {
+        const cache = await opened;
+        const result = cache.query(method, sql, params);
+        // onLookup runs synchronously inside query()
+        const cached = lastLookupCached;
+        parentPort.postMessage({ id, rows: await result, cached });
+    } catch (error) {
+        parentPort.postMessage({ id, error: serializeError(error) });
+    }
+});
@@ -0,0 +1,85 @@
+// Prepared statements kept alive per connection and keyed by SQL text. Every
+// query here binds its values as parameters, so the text is the query's
+// shape: repeated searches skip parsing and planning and only rebind.
+// SQLite re-prepares a cached statement by itself when the schema changes,
+// e.g. after a full sync swaps the product tables.
+
+const DEFAULT_MAX_ENTRIES = 64;
+
+// Same all()/get() callback API as a sqlite3.Database. onLookup(cached) is
+// called for every query, for metrics.
+function createStatementCache(db, { maxEntries = DEFAULT_MAX_ENTRIES, onLookup = () => {} } = {}) {
+    // Map order doubles as recency order, most recent last
+    const statements = new Map();
+    let hits = 0;
+    let misses = 0;
+
+    function discard(entry) {
+        entry.ready.then((stmt) => stmt.finalize(), () => {});
+    }
+
+    function entryFor(sql) {
+        let entry = statements.get(sql);
+        if (entry) {
+            hits += 1;
+            statements.delete(sql);
+            statements.set(sql, entry);
+            return { entry, cached: true };
+        }
+
+        misses += 1;
+        entry = {};
+        entry.ready = new Promise((resolve, reject) => {
+            const stmt = db.prepare(sql, (err) => (err ? reject(err) : resolve(stmt)));
+        });
+        // A statement that failed to prepare is not worth keeping
+        entry.ready.catch(() => {
+            if (statements.get(sql) === entry) statements.delete(sql);
+        });
+        statements.set(sql, entry);
+
+        while (statements.size > maxEntries) {
+            const [oldestSql, oldest] = statements.entries().next().value;
+            statements.delete(oldestSql);
+            discard(oldest);
+        }
+        return { entry, cached: false };
+    }
+
+    // Resolves to the rows (all) or row (get)
+    async function query(method, sql, params = []) {
+        const { entry, cached } = entryFor(sql);
+        onLookup(cached);
+        const stmt = await entry.ready;
+        return new Promise((resolve, reject) => {
+            stmt[method](params, (err, result) => {
+                // get() leaves the statement open, holding a read snapshot until reset
+                if (method === 'get') stmt.reset();
+                if (err) reject(err);
+                else resolve(result);
+            });
+        });
+    }
+
+    function callbackStyle(method) {
+        return (sql, params, callback) => {
+            const cb = typeof params === 'function' ? params : callback;
+            const args = typeof params === 'function' ? [] : params;
+            query(method, sql, args).then((result) => cb(null, result), (error) => cb(error));
+        };
+    }
+
+    return {
+        all: callbackStyle('all'),
+        get: callbackStyle('get'),
+        query,
+
+        stats() {
+            return { entries: statements.size, hits, misses };
+        },
+    };
+}
+
+module.exports = {
+    createStatementCache,
+};
@@ -0,0 +1,64 @@
+// Run statements in one transaction on a sqlite3 connection. The callback
+// API gives no error for a statement queued without a callback (sqlite3 emits
+// it on the Database instead), so every statement reports to track() and
+// the transaction only commits if none of them failed.
+//
+// sqlite3 has one transaction per connection, and COMMIT is queued from a
+// callback, outside serialize(). Transactions on the same connection therefore
+// wait for the previous one to finish, or a second BEGIN would fail and the
+// first COMMIT would commit the other caller's statements too.
+
+// Per connection: settles once its last queued transaction has finished
+const queues = new WeakMap();
+
+// One transaction, started right away
+function execute(db, queueStatements) {
+    return new Promise((resolve, reject) => {
+        let firstError = null;
+        const track = (err) => {
+            if (err && !firstError) firstError = err;
+        };
+
+        db.serialize(() => {
+            db.run('BEGIN TRANSACTION', track);
+            queueStatements(track);
+
+            // Serialized, so this runs after everything queued above has finished
+            db.get('SELECT 1', [], () => {
+                if (firstError) {
+                    db.run('ROLLBACK', () => reject(firstError));
+                    return;
+                }
+                db.run('COMMIT', (commitErr) => {
+                    if (commitErr) {
+                        db.run('ROLLBACK');
+                        reject(commitErr);
+                    } else {
+                        resolve();
+                    }
+                });
+            });
+        });
+    });
+}
+
+// queueStatements(track) queues db.run(sql, params, track) calls; resolves
+// once committed, rejects with the first error after rolling back
+function runTransaction(db, queueStatements) {
+    const previous = queues.get(db) || Promise.resolve();
+    const run = previous.then(() => execute(db, queueStatements));
+    queues.set(db, run.catch(() => {}));
+    return run;
+}
+
+// Run parameterless statements, e.g. a derived table's rebuildSql(), atomically
+function runStatements(db, statements) {
+    return runTransaction(db, (track) => {
+        statements.forEach((sql) => db.run(sql, [], track));
+    });
+}
+
+module.exports = {
+    runTransaction,
+    runStatements,
+};
@@ -0,0 +1,112 @@
+const { monitorEventLoopDelay } = require('perf_hooks');
+const { createRegistry } = require('./registry');
+
+// Process-wide registry behind GET /metrics
+const registry = createRegistry();
+
+const SYNC_BUCKETS = [1, 5, 10, 30, 60, 120, 300, 600, 1200];
+
+const httpRequestDuration = registry.histogram({
+    name: 'http_request_duration_seconds',
+    help: 'HTTP request latency by route',
+    labelNames: ['method', 'route', 'status'],
+});
+
+const sqliteQueryDuration = registry.histogram({
+    name: 'sqlite_query_duration_seconds',
+    help: 'SQLite query duration by operation',
+    labelNames: ['operation'],
+});
+
+const sqliteStatementCache = registry.counter({
+    name: 'sqlite_statement_cache_total',
+    help: 'Prepared statement lookups on the read connections (hit, miss)',
+    labelNames: ['result'],
+});
+
+const searchDuration = registry.histogram({
+    name: 'search_duration_seconds',
+    help: 'Search execution time by the index that answered',
+    labelNames: ['source'],
+});
+
+const cacheRequests = registry.counter({
+    name: 'cache_requests_total',
+    help: 'Cache lookups by tier and result (hit, stale_hit, negative_hit, miss, error)',
+    labelNames: ['tier', 'result'],
+});
+
+const cacheCompressedHits = registry.counter({
+    name: 'cache_compressed_hits_total',
+    help: 'Redis cache hits that had to be decompressed',
+});
+
+const redisCommandDuration = registry.histogram({
+    name: 'redis_command_duration_seconds',
+    help: 'Redis command latency',
+    labelNames: ['command'],
+});
+
+const syncDuration = registry.histogram({
+    name: 'sync_duration_seconds',
+    help: 'Product sync duration',
+    labelNames: ['mode', 'status'],
+    buckets: SYNC_BUCKETS,
+});
+
+const syncRows = registry.counter({
+    name: 'sync_rows_total',
+    help: 'Products changed by syncs',
+    labelNames: ['mode', 'change'],
+});
+
+// Event-loop delay since the previous scrape
+const eventLoopDelay = monitorEventLoopDelay({ resolution: 20 });
+eventLoopDelay.enable();
+
+registry.gauge({
+    name: 'eventloop_lag_seconds',
+    help: 'Event-loop delay since the previous scrape',
+    labelNames: ['stat'],
+    collect(set) {
+        const toSeconds = (ns) => (Number.isFinite(ns) ? ns / 1e9 : 0);
+        set({ stat: 'mean' }, toSeconds(eventLoopDelay.mean));
+        set({ stat: 'p50' }, toSeconds(eventLoopDelay.percentile(50)));
+        set({ stat: 'p99' }, toSeconds(eventLoopDelay.percentile(99)));
+        set({ stat: 'max' }, toSeconds(eventLoopDelay.max));
+        eventLoopDelay.reset();
+    },
+});
+
+registry.gauge({
+    name: 'process_memory_bytes',
+    help: 'Process memory usage',
+    labelNames: ['type'],
+    collect(set) {
+        const usage = process.memoryUsage();
+        set({ type: 'heap_used' }, usage.heapUsed);
+        set({ type: 'heap_total' }, usage.heapTotal);
+        set({ type: 'external' }, usage.external);
+        set({ type: 'rss' }, usage.rss);
+    },
+});
+
+// Time a promise-returning operation without changing its outcome
+function timed(histogram, labels, promise) {
+    const end = histogram.startTimer(labels);
+    return promise.finally(() => end());
+}
+
+module.exports = {
+    registry,
+    httpRequestDuration,
+    sqliteQueryDuration,
+    sqliteStatementCache,
+    searchDuration,
+    cacheRequests,
+    cacheCompressedHits,
+    redisCommandDuration,
+    syncDuration,
+    syncRows,
+    timed,
+};
@@ -0,0 +1,155 @@
+const { performance } = require('perf_hooks');
+
+// Seconds; suits everything from an in-memory lookup to a slow request
+const DEFAULT_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10];
+
+function escapeLabelValue(value) {
+    return String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n');
+}
+
+function formatLabels(names, values, extra = '') {
+    const pairs = names.map((name, i) => `${name}="${escapeLabelValue(values[i])}"`);
+    if (extra) pairs.push(extra);
+    return pairs.length ? `{${pairs.join(',')}}` : '';
+}
+
+function formatValue(value) {
+    if (value === Infinity) return '+Inf';
+    if (value === -Infinity) return '-Inf';
+    return String(value);
+}
+
+// Series are keyed by their label values in labelNames order, so recording
+// a sample is a Map lookup plus a few arithmetic operations.
+function createSeries(labelNames, init) {
+    const series = new Map();
+    return {
+        get(labels = {}) {
+            const values = labelNames.map((name) => labels[name] ?? '');
+            const key = values.join('\u0001');
+            let entry = series.get(key);
+            if (!entry) {
+                entry = { values, ...init() };
+                series.set(key, entry);
+            }
+            return entry;
+        },
+        entries: () => series.values(),
+    };
+}
+
+// Minimal in-process metrics registry rendering the Prometheus text format.
+// Nothing is computed until scrape time apart from the samples themselves.
+function createRegistry() {
+    const metrics = [];
+
+    function register(metric) {
+        if (metrics.some((existing) => existing.name === metric.name)) {
+            throw new Error(`Metric '${metric.name}' is already registered`);
+        }
+        metrics.push(metric);
+        return metric;
+    }
+
+    function counter({ name, help, labelNames = [] }) {
+        const series = createSeries(labelNames, () => ({ value: 0 }));
+        return register({
+            name,
+            inc(labels, value = 1) {
+                series.get(labels).value += value;
+            },
+            render() {
+                const lines = [`# HELP ${name} ${help}`, `# TYPE ${name} counter`];
+                for (const entry of series.entries()) {
+                    lines.push(`${name}${formatLabels(labelNames, entry.values)} ${formatValue(entry.value)}`);
+                }
+                return lines;
+            },
+        });
+    }
+
+    // collect(set) runs at scrape time, for values that are cheaper to read
+    // on demand (heap usage) than to keep current
+    function gauge({
+        name, help, labelNames = [], collect,
+    }) {
+        const series = createSeries(labelNames, () => ({ value: 0 }));
+        const set = (labels, value) => {
+            series.get(labels).value = value;
+        };
+        return register({
+            name,
+            set,
+            render() {
+                if (collect) collect(set);
+                const lines = [`# HELP ${name} ${help}`, `# TYPE ${name} gauge`];
+                for (const entry of series.entries()) {
+                    lines.push(`${name}${formatLabels(labelNames, entry.values)} ${formatValue(entry.value)}`);
+                }
+                return lines;
+            },
+        });
+    }
+
+    function histogram({
+        name, help, labelNames = [], buckets = DEFAULT_BUCKETS,
+    }) {
+        const bounds = [...buckets].sort((a, b) => a - b);
+        // Per-bucket (not cumulative) counts; the last slot is +Inf
+        const series = createSeries(labelNames, () => ({
+            counts: new Float64Array(bounds.length + 1),
+            sum: 0,
+            count: 0,
+        }));
+
+        function observe(labels, value) {
+            const entry = series.get(labels);
+            let i = 0;
+            while (i < bounds.length && value > bounds[i]) i += 1;
+            entry.counts[i] += 1;
+            entry.sum += value;
+            entry.count += 1;
+        }
+
+        return register({
+            name,
+            observe,
+            // Returns end(extraLabels), which records the elapsed seconds
+            startTimer(labels = {}) {
+                const start = performance.now();
+                return (extraLabels) => {
+                    const seconds = (performance.now() - start) / 1000;
+                    observe(extraLabels ? { ...labels, ...extraLabels } : labels, seconds);
+                    return seconds;
+                };
+            },
+            render() {
+                const lines = [`# HELP ${name} ${help}`, `# TYPE ${name} histogram`];
+                for (const entry of series.entries()) {
+                    let cumulative = 0;
+                    bounds.forEach((bound, i) => {
+                        cumulative += entry.counts[i];
+                        lines.push(`${name}_bucket${formatLabels(labelNames, entry.values, `le="${bound}"`)} ${cumulative}`);
+                    });
+                    lines.push(`${name}_bucket${formatLabels(labelNames, entry.values, 'le="+Inf"')} ${entry.count}`);
+                    lines.push(`${name}_sum${formatLabels(labelNames, entry.values)} ${entry.sum}`);
+                    lines.push(`${name}_count${formatLabels(labelNames, entry.values)} ${entry.count}`);
+                }
+                return lines;
+            },
+        });
+    }
+
+    return {
+        counter,
+        gauge,
+        histogram,
+        contentType: 'text/plain; version=0.0.4; charset=utf-8',
+        render: () => `${metrics.flatMap((metric) => metric.render()).join('\n')}\n`,
+    };
+}
+
+module.exports = {
+    DEFAULT_BUCKETS,
+    createRegistry,
+};
@@ -0,0 +1,97 @@
+// Normalized barcode -> product lookup table. products.barcodes holds a JSON
+// array per product, so exact scanner lookups get their own primary key index.
+
+const { runStatements } = require('../db/transaction');
+
+const BARCODE_TABLE = 'product_barcodes';
+
+// Scanner input: EAN-8, UPC-A, EAN-13, GTIN-14 and friends are all digits
+const BARCODE_PATTERN = /^\d+$/;
+
+function createTableSql(table = BARCODE_TABLE) {
+    return `
+        CREATE TABLE IF NOT EXISTS ${table} (
+            barcode TEXT PRIMARY KEY,
+            product_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+    `;
+}
+
+// A barcode shared by several products keeps the first product it was seen on
+function rebuildSql(table = BARCODE_TABLE, source = 'products') {
+    return [
+        `DELETE FROM ${table}`,
+        `INSERT OR IGNORE INTO ${table} (barcode, product_id)
+         SELECT TRIM(b.value), p.id
+         FROM ${source} p, json_each(p.barcodes) b
+         WHERE json_valid(p.barcodes) AND TRIM(b.value) <> ''
+         ORDER BY p.id`,
+    ];
+}
+
+// Per-product maintenance for incremental syncs, keyed by $item_code. The
+// delete goes through the product's stored barcodes so it can use the key.
+function deleteRowSql(table = BARCODE_TABLE, source = 'products') {
+    return `DELETE FROM ${table}
+            WHERE barcode IN (
+                SELECT TRIM(b.value) FROM ${source} p, json_each(p.barcodes) b
+                WHERE p.item_code = $item_code AND json_valid(p.barcodes)
+            )
+            AND product_id = (SELECT id FROM ${source} WHERE item_code = $item_code)`;
+}
+
+function insertRowSql(table = BARCODE_TABLE, source = 'products') {
+    return `INSERT OR IGNORE INTO ${table} (barcode, product_id)
+            SELECT TRIM(b.value), p.id
+            FROM ${source} p, json_each(p.barcodes) b
+            WHERE p.item_code = $item_code AND json_valid(p.barcodes) AND TRIM(b.value) <> ''`;
+}
+
+function isBarcode(query) {
+    return typeof query === 'string' && BARCODE_PATTERN.test(query.trim());
+}
+
+function lookup(db, barcode) {
+    return new Promise((resolve, reject) => {
+        db.get(
+            `SELECT p.* FROM ${BARCODE_TABLE} b
+             JOIN products p ON p.id = b.product_id
+             WHERE b.barcode = ?`,
+            [String(barcode).trim()],
+            (err, row) => (err ? reject(err) : resolve(row || null)),
+        );
+    });
+}
+
+// Fill the table on the first start after upgrading an existing database
+function ensurePopulated(db) {
+    return new Promise((resolve, reject) => {
+        db.get(
+            `SELECT EXISTS (SELECT 1 FROM ${BARCODE_TABLE}) AS populated,
+                    EXISTS (SELECT 1 FROM products WHERE barcodes NOT IN ('', '[]')) AS hasBarcodes`,
+            (err, row) => {
+                if (err) {
+                    reject(err);
+                    return;
+                }
+                if (row.populated || !row.hasBarcodes) {
+                    resolve(false);
+                    return;
+                }
+                runStatements(db, rebuildSql()).then(() => resolve(true), reject);
+            },
+        );
+    });
+}
+
+module.exports = {
+    TABLE: BARCODE_TABLE,
+    BARCODE_TABLE,
+    createTableSql,
+    rebuildSql,
+    deleteRowSql,
+    insertRowSql,
+    isBarcode,
+    lookup,
+    ensurePopulated,
+};
@@ -0,0 +1,122 @@
+// FTS5 full-text index over the searchable product columns.
+// The index keeps its own copy of the text with rowid = products.id, so it can
+// be rebuilt wholesale at the end of a sync without touching products.
+
+const { runStatements } = require('../db/transaction');
+
+const FTS_TABLE = 'products_fts';
+
+const FTS_COLUMNS = [
+    'name',
+    'item_code',
+    'description',
+    'description2',
+    'extra_desc1',
+    'extra_desc2',
+    'barcodes',
+];
+
+// bm25() column weights, in FTS_COLUMNS order
+const BM25_WEIGHTS = [10.0, 8.0, 2.0, 2.0, 1.0, 1.0, 5.0];
+
+const SEARCH_LIMIT = 100;
+
+// Any term without at least one letter or digit produces no FTS tokens
+const INDEXABLE_TERM = /[\p{L}\p{N}]/u;
+
+function createTableSql(table = FTS_TABLE) {
+    return `
+        CREATE VIRTUAL TABLE IF NOT EXISTS ${table} USING fts5(
+            ${FTS_COLUMNS.join(',\n            ')},
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        )
+    `;
+}
+
+function rebuildSql(table = FTS_TABLE, source = 'products') {
+    return [
+        `DELETE FROM ${table}`,
+        `INSERT INTO ${table} (rowid, ${FTS_COLUMNS.join(', ')})
+         SELECT id, ${FTS_COLUMNS.join(', ')} FROM ${source}`,
+    ];
+}
+
+// Per-product maintenance for incremental syncs, keyed by $item_code.
+// Run deleteRowSql before products changes and insertRowSql after.
+function deleteRowSql(table = FTS_TABLE, source = 'products') {
+    return `DELETE FROM ${table} WHERE rowid = (SELECT id FROM ${source} WHERE item_code = $item_code)`;
+}
+
+function insertRowSql(table = FTS_TABLE, source = 'products') {
+    return `INSERT INTO ${table} (rowid, ${FTS_COLUMNS.join(', ')})
+            SELECT id, ${FTS_COLUMNS.join(', ')} FROM ${source} WHERE item_code = $item_code`;
+}
+
+// Turn free text into an FTS5 MATCH expression: every term must match,
+// and the last token of each term is matched as a prefix.
+function buildMatchExpression(query) {
+    if (typeof query !== 'string') return null;
+
+    const terms = query
+        .split(/\s+/)
+        .filter((term) => INDEXABLE_TERM.test(term))
+        .map((term) => `"${term.replace(/"/g, '""')}"*`);
+
+    return terms.length ? terms.join(' AND ') : null;
+}
+
+// condition is an optional { sql, params } on products p (e.g. a stock
+// filter), applied before the limit
+function search(db, query, limit = SEARCH_LIMIT, condition = null) {
+    const matchExpression = buildMatchExpression(query);
+    if (!matchExpression) return Promise.resolve(null);
+
+    return new Promise((resolve, reject) => {
+        db.all(
+            `SELECT p.* FROM ${FTS_TABLE}
+             JOIN products p ON p.id = ${FTS_TABLE}.rowid
+             WHERE ${FTS_TABLE} MATCH ?${condition ? ` AND ${condition.sql}` : ''}
+             ORDER BY bm25(${FTS_TABLE}, ${BM25_WEIGHTS.join(', ')})
+             LIMIT ?`,
+            [matchExpression, ...(condition ? condition.params : []), limit],
+            (err, rows) => (err ? reject(err) : resolve(rows)),
+        );
+    });
+}
+
+// Populate an index if it is out of step with products, e.g. the first start
+// after upgrading an existing database.
+function ensurePopulated(db, table = FTS_TABLE, statements = rebuildSql()) {
+    return new Promise((resolve, reject) => {
+        db.get(
+            `SELECT (SELECT COUNT(*) FROM products) AS products,
+                    (SELECT COUNT(*) FROM ${table}) AS indexed`,
+            (err, row) => {
+                if (err) {
+                    reject(err);
+                    return;
+                }
+                if (row.products === row.indexed) {
+                    resolve(false);
+                    return;
+                }
+                runStatements(db, statements).then(() => resolve(true), reject);
+            },
+        );
+    });
+}
+
+module.exports = {
+    TABLE: FTS_TABLE,
+    FTS_TABLE,
+    FTS_COLUMNS,
+    BM25_WEIGHTS,
+    createTableSql,
+    rebuildSql,
+    deleteRowSql,
+    insertRowSql,
+    buildMatchExpression,
+    search,
+    ensurePopulated,
+};
@@ -0,0 +1,275 @@
+// In-process inverted index over the product catalog.
+// Tokens map to sorted posting lists (Uint32Array of positions in `rows`), and
+// queries are answered by intersecting them without touching SQLite. Each
+// posting also records which columns held the token, so matches are ranked
+// with the same per-column weights as the FTS index.
+// Builds run outside request handling and the finished index replaces the
+// current one in a single assignment, so searches never see a partial index.
+
+const { FTS_COLUMNS, BM25_WEIGHTS } = require('./fts');
+
+const SEARCH_LIMIT = 100;
+
+// Rows tokenized between yields to the event loop while building
+const BUILD_CHUNK_SIZE = 1000;
+
+// Ranking weights for a query token hitting an index token exactly or by
+// prefix, multiplied by the weights of the columns it hit
+const EXACT_MATCH_SCORE = 2;
+const PREFIX_MATCH_SCORE = 1;
+
+// Sum of BM25_WEIGHTS for every column set in a mask, one entry per mask
+const COLUMN_WEIGHTS = Float64Array.from(
+    { length: 2 ** FTS_COLUMNS.length },
+    (_, mask) => BM25_WEIGHTS.reduce((sum, weight, column) => (mask & (1 << column) ? sum + weight : sum), 0),
+);
+
+let currentIndex = null;
+let rebuildInFlight = null;
+let rebuildQueued = false;
+
+function tokenize(text) {
+    if (text === null || text === undefined) return [];
+    return String(text)
+        .toLowerCase()
+        .normalize('NFD')
+        .replace(/\p{M}/gu, '')
+        .split(/[^\p{L}\p{N}]+/u)
+        .filter(Boolean);
+}
+
+const yieldToEventLoop = () => new Promise((resolve) => setImmediate(resolve));
+
+async function build(rows) {
+    const postings = new Map();
+
+    for (let start = 0; start < rows.length; start += BUILD_CHUNK_SIZE) {
+        const end = Math.min(start + BUILD_CHUNK_SIZE, rows.length);
+        for (let position = start; position < end; position += 1) {
+            const row = rows[position];
+            FTS_COLUMNS.forEach((column, columnIndex) => {
+                const bit = 1 << columnIndex;
+                tokenize(row[column]).forEach((token) => {
+                    let list = postings.get(token);
+                    if (!list) {
+                        list = { positions: [], columns: [] };
+                        postings.set(token, list);
+                    }
+                    // Rows are visited in order, so checking the tail keeps lists unique
+                    const last = list.positions.length - 1;
+                    if (list.positions[last] === position) {
+                        list.columns[last] |= bit;
+                    } else {
+                        list.positions.push(position);
+                        list.columns.push(bit);
+                    }
+                });
+            });
+        }
+        if (end < rows.length) await yieldToEventLoop();
+    }
+
+    const tokens = new Map();
+    postings.forEach(({ positions, columns }, token) => tokens.set(token, {
+        positions: Uint32Array.from(positions),
+        columns: Uint8Array.from(columns),
+    }));
+
+    return {
+        rows,
+        tokens,
+        sortedTokens: [...tokens.keys()].sort(),
+        builtAt: new Date(),
+    };
+}
+
+// First position in sortedTokens that is >= prefix
+function lowerBound(sortedTokens, prefix) {
+    let low = 0;
+    let high = sortedTokens.length;
+    while (low < high) {
+        const mid = (low + high) >>> 1;
+        if (sortedTokens[mid] < prefix) low = mid + 1;
+        else high = mid;
+    }
+    return low;
+}
+
+// Positions of every row with an index token starting with prefix, and for
+// each row (by position) the columns those tokens were found in
+function prefixPostings(index, prefix) {
+    const columns = new Uint8Array(index.rows.length);
+    let count = 0;
+    for (let i = lowerBound(index.sortedTokens, prefix); i < index.sortedTokens.length; i += 1) {
+        const token = index.sortedTokens[i];
+        if (!token.startsWith(prefix)) break;
+        const list = index.tokens.get(token);
+        list.positions.forEach((position, j) => {
+            if (!columns[position]) count += 1;
+            columns[position] |= list.columns[j];
+        });
+    }
+
+    const positions = new Uint32Array(count);
+    let next = 0;
+    for (let position = 0; position < columns.length && next < count; position += 1) {
+        if (columns[position]) {
+            positions[next] = position;
+            next += 1;
+        }
+    }
+    return { positions, columns };
+}
+
+function intersect(left, right) {
+    const result = new Uint32Array(Math.min(left.length, right.length));
+    let i = 0;
+    let j = 0;
+    let count = 0;
+    while (i < left.length && j < right.length) {
+        if (left[i] === right[j]) {
+            result[count] = left[i];
+            count += 1;
+            i += 1;
+            j += 1;
+        } else if (left[i] < right[j]) {
+            i += 1;
+        } else {
+            j += 1;
+        }
+    }
+    return result.subarray(0, count);
+}
+
+// Columns mask of position in a token's posting list, 0 when absent
+function columnsAt(list, position) {
+    let low = 0;
+    let high = list.positions.length - 1;
+    while (low <= high) {
+        const mid = (low + high) >>> 1;
+        if (list.positions[mid] === position) return list.columns[mid];
+        if (list.positions[mid] < position) low = mid + 1;
+        else high = mid - 1;
+    }
+    return 0;
+}
+
+// Returns matching rows, or null when the index is not loaded yet or the query
+// has nothing to look up, so the caller can fall back to SQLite.
+function search(query, limit = SEARCH_LIMIT) {
+    const index = currentIndex;
+    if (!index) return null;
+
+    const queryTokens = [...new Set(tokenize(query))];
+    if (!queryTokens.length) return null;
+
+    const matches = queryTokens.map((token) => ({
+        exact: index.tokens.get(token),
+        prefix: prefixPostings(index, token),
+    }));
+    const candidates = matches
+        .map(({ prefix }) => prefix.positions)
+        .sort((a, b) => a.length - b.length)
+        .reduce((found, list) => (found.length ? intersect(found, list) : found));
+
+    // A token scores the better of its exact hit and its prefix hits, each
+    // weighted by the columns it was found in
+    const scored = Array.from(candidates, (position) => {
+        let score = 0;
+        matches.forEach(({ exact, prefix }) => {
+            const exactColumns = exact ? columnsAt(exact, position) : 0;
+            score += Math.max(
+                EXACT_MATCH_SCORE * COLUMN_WEIGHTS[exactColumns],
+                PREFIX_MATCH_SCORE * COLUMN_WEIGHTS[prefix.columns[position]],
+            );
+        });
+        return { position, score };
+    });
+
+    scored.sort((a, b) => b.score - a.score || a.position - b.position);
+    return scored.slice(0, limit).map(({ position }) => index.rows[position]);
+}
+
+function loadRows(db) {
+    return new Promise((resolve, reject) => {
+        db.all('SELECT * FROM products ORDER BY id', [], (err, rows) => (err ? reject(err) : resolve(rows)));
+    });
+}
+
+// Build a fresh index from products and swap it in. Calls made while a build
+// is running are folded into one follow-up build.
+function rebuild(db) {
+    if (rebuildInFlight) {
+        rebuildQueued = true;
+        return rebuildInFlight;
+    }
+
+    rebuildInFlight = (async () => {
+        try {
+            do {
+                rebuildQueued = false;
+                const next = await build(await loadRows(db));
+                currentIndex = next;
+            } while (rebuildQueued);
+            return currentIndex;
+        } finally {
+            rebuildInFlight = null;
+        }
+    })();
+
+    return rebuildInFlight;
+}
+
+// Position of the row with this id; rows are loaded ORDER BY id
+function positionOf(rows, id) {
+    let low = 0;
+    let high = rows.length - 1;
+    while (low <= high) {
+        const mid = (low + high) >>> 1;
+        if (rows[mid].id === id) return mid;
+        if (rows[mid].id < id) low = mid + 1;
+        else high = mid - 1;
+    }
+    return -1;
+}
+
+// Apply { id, ...columns } patches to the loaded rows without a rebuild. Only
+// for columns that are not tokenized (e.g. warehouse_data); anything else
+// needs rebuild(). A build already loading rows is re-run so it cannot swap
+// in rows from before the patch. Returns the number of rows patched.
+function updateRows(patches) {
+    if (rebuildInFlight) rebuildQueued = true;
+    const index = currentIndex;
+    if (!index) return 0;
+
+    let patched = 0;
+    patches.forEach(({ id, ...columns }) => {
+        const position = positionOf(index.rows, id);
+        if (position === -1) return;
+        // Replace rather than mutate, rows may be held by in-flight responses
+        index.rows[position] = { ...index.rows[position], ...columns };
+        patched += 1;
+    });
+    return patched;
+}
+
+function isReady() {
+    return currentIndex !== null;
+}
+
+function stats() {
+    const index = currentIndex;
+    return index
+        ? { rows: index.rows.length, tokens: index.tokens.size, builtAt: index.builtAt }
+        : { rows: 0, tokens: 0, builtAt: null };
+}
+
+module.exports = {
+    tokenize,
+    build,
+    rebuild,
+    search,
+    updateRows,
+    isReady,
+    stats,
+};
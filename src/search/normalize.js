@@ -0,0 +1,45 @@
+// Canonical form of a search query, used both as the search input and as the
+// cache key, so "Blue Shirt", "blue  shirt" and "shirt blue" share one entry.
+
+const crypto = require('crypto');
+
+const LOCALE = 'is';
+
+// Longer normalized queries are hashed rather than embedded in the Redis key
+const MAX_KEY_LENGTH = 100;
+
+// Terms without a letter or digit are not indexed, so only such queries fall
+// back to the order-sensitive LIKE scan
+const INDEXABLE_TERM = /[\p{L}\p{N}]/u;
+
+// NFKC folds compatibility forms (full-width digits from some scanners,
+// ligatures) and composes accents, so "á" typed as a + combining acute equals
+// the precomposed letter. Icelandic letters (á, ð, þ, æ, ö) are kept as they
+// are, and lowercasing uses Icelandic rules.
+function normalizeQuery(query) {
+    if (typeof query !== 'string') return '';
+
+    const terms = query
+        .normalize('NFKC')
+        .toLocaleLowerCase(LOCALE)
+        .split(/\s+/)
+        .filter(Boolean);
+
+    // Every index ANDs terms and ranks them independently of order. Icelandic
+    // collation, so þ sorts before æ as it does in the alphabet.
+    if (terms.some((term) => INDEXABLE_TERM.test(term))) {
+        return [...new Set(terms)].sort((a, b) => a.localeCompare(b, LOCALE)).join(' ');
+    }
+    return terms.join(' ');
+}
+
+// Identifier for a normalized query inside a cache key
+function cacheIdentifier(normalizedQuery) {
+    if (normalizedQuery.length <= MAX_KEY_LENGTH) return normalizedQuery;
+    return `h:${crypto.createHash('sha1').update(normalizedQuery).digest('hex')}`;
+}
+
+module.exports = {
+    normalizeQuery,
+    cacheIdentifier,
+};
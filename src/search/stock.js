@@ -0,0 +1,168 @@
+// Normalized per-warehouse stock. products.warehouse_data holds the feed's
+// Warehouses JSON array; this table gives stock filters an index instead of
+// a JSON parse per product.
+
+const { runStatements } = require('../db/transaction');
+
+const STOCK_TABLE = 'warehouse_stock';
+
+// Warehouse codes as the feed spells them, e.g. 'bg1'
+const WAREHOUSE_PATTERN = /^[A-Za-z0-9_-]{1,32}$/;
+
+const RESULT_LIMIT = 100;
+
+// Keyed by product for per-product maintenance; the secondary index answers
+// "what is in stock in warehouse X"
+function createTableSql(table = STOCK_TABLE) {
+    return `
+        CREATE TABLE IF NOT EXISTS ${table} (
+            product_id INTEGER NOT NULL,
+            warehouse TEXT NOT NULL,
+            quantity REAL NOT NULL DEFAULT 0,
+            location TEXT,
+            PRIMARY KEY (product_id, warehouse)
+        ) WITHOUT ROWID
+    `;
+}
+
+// Index names are fixed per suffix rather than per table, so they follow the
+// products table's alternating suffix across staging swaps
+function createIndexesSql(table = STOCK_TABLE, suffix = '') {
+    return [
+        `CREATE INDEX IF NOT EXISTS idx_${STOCK_TABLE}_quantity${suffix} ON ${table}(warehouse, quantity)`,
+    ];
+}
+
+// Shared SELECT over the products' warehouse JSON; a warehouse listed twice
+// for one product keeps its first entry, as the client always did
+function selectStockSql(source, where) {
+    return `SELECT p.id,
+                   TRIM(json_extract(w.value, '$.Warehouse')),
+                   COALESCE(CAST(json_extract(w.value, '$.QuantityInStock') AS REAL), 0),
+                   NULLIF(TRIM(json_extract(w.value, '$.LocationInWarehouse')), '')
+            FROM ${source} p, json_each(p.warehouse_data) w
+            WHERE ${where}
+              AND json_valid(p.warehouse_data)
+              AND TRIM(COALESCE(json_extract(w.value, '$.Warehouse'), '')) <> ''
+            ORDER BY p.id, w.key`;
+}
+
+function rebuildSql(table = STOCK_TABLE, source = 'products') {
+    return [
+        `DELETE FROM ${table}`,
+        `INSERT OR IGNORE INTO ${table} (product_id, warehouse, quantity, location)
+         ${selectStockSql(source, '1')}`,
+    ];
+}
+
+// Per-product maintenance for incremental syncs, keyed by $item_code
+function deleteRowSql(table = STOCK_TABLE, source = 'products') {
+    return `DELETE FROM ${table}
+            WHERE product_id = (SELECT id FROM ${source} WHERE item_code = $item_code)`;
+}
+
+function insertRowSql(table = STOCK_TABLE, source = 'products') {
+    return `INSERT OR IGNORE INTO ${table} (product_id, warehouse, quantity, location)
+            ${selectStockSql(source, 'p.item_code = $item_code')}`;
+}
+
+function isWarehouse(code) {
+    return typeof code === 'string' && WAREHOUSE_PATTERN.test(code);
+}
+
+// Stock condition for { warehouse, minQty }: without a warehouse any one will
+// do, without minQty anything above zero counts as in stock
+function stockCondition({ warehouse, minQty } = {}) {
+    const clauses = [];
+    const params = [];
+    if (warehouse) {
+        clauses.push('s.warehouse = ?');
+        params.push(warehouse);
+    }
+    if (minQty === undefined || minQty === null) {
+        clauses.push('s.quantity > 0');
+    } else {
+        clauses.push('s.quantity >= ?');
+        params.push(minQty);
+    }
+    return { where: clauses.join(' AND '), params };
+}
+
+// Condition on products p keeping those with stock matching the filter, for
+// searches that apply it before their LIMIT
+function productCondition(filter) {
+    const { where, params } = stockCondition(filter);
+    return {
+        sql: `p.id IN (SELECT s.product_id FROM ${STOCK_TABLE} s WHERE ${where})`,
+        params,
+    };
+}
+
+// The subset of productIds with stock matching the filter. The ids travel as
+// one JSON parameter, so every call shares one statement text.
+function filterInStock(db, productIds, filter) {
+    if (!productIds.length) return Promise.resolve(new Set());
+    const { where, params } = stockCondition(filter);
+
+    return new Promise((resolve, reject) => {
+        db.all(
+            `SELECT DISTINCT s.product_id FROM ${STOCK_TABLE} s
+             WHERE s.product_id IN (SELECT value FROM json_each(?)) AND ${where}`,
+            [JSON.stringify(productIds), ...params],
+            (err, rows) => (err ? reject(err) : resolve(new Set(rows.map((row) => row.product_id)))),
+        );
+    });
+}
+
+// Products in stock in one warehouse, largest quantity first
+function inStock(db, { warehouse, minQty, limit = RESULT_LIMIT }) {
+    const { where, params } = stockCondition({ warehouse, minQty });
+
+    return new Promise((resolve, reject) => {
+        db.all(
+            `SELECT p.* FROM ${STOCK_TABLE} s
+             JOIN products p ON p.id = s.product_id
+             WHERE ${where}
+             ORDER BY s.quantity DESC
+             LIMIT ?`,
+            [...params, limit],
+            (err, rows) => (err ? reject(err) : resolve(rows)),
+        );
+    });
+}
+
+// Fill the table on the first start after upgrading an existing database
+function ensurePopulated(db) {
+    return new Promise((resolve, reject) => {
+        db.get(
+            `SELECT EXISTS (SELECT 1 FROM ${STOCK_TABLE}) AS populated,
+                    EXISTS (SELECT 1 FROM products WHERE warehouse_data NOT IN ('', '[]')) AS hasStock`,
+            (err, row) => {
+                if (err) {
+                    reject(err);
+                    return;
+                }
+                if (row.populated || !row.hasStock) {
+                    resolve(false);
+                    return;
+                }
+                runStatements(db, rebuildSql()).then(() => resolve(true), reject);
+            },
+        );
+    });
+}
+
+module.exports = {
+    TABLE: STOCK_TABLE,
+    STOCK_TABLE,
+    createTableSql,
+    createIndexesSql,
+    rebuildSql,
+    deleteRowSql,
+    insertRowSql,
+    isWarehouse,
+    productCondition,
+    filterInStock,
+    inStock,
+    ensurePopulated,
+};
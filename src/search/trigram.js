@@ -0,0 +1,88 @@
+// Trigram index for substring ("infix") matches on item codes and barcodes,
+// e.g. the last digits of an EAN, which prefix matching in products_fts misses.
+
+const fts = require('./fts');
+
+const TRIGRAM_TABLE = 'products_trigram';
+
+const TRIGRAM_COLUMNS = ['item_code', 'barcodes'];
+
+// Trigram tokens are three characters long, shorter terms cannot match
+const MIN_TERM_LENGTH = 3;
+
+const SEARCH_LIMIT = 100;
+
+function createTableSql(table = TRIGRAM_TABLE) {
+    return `
+        CREATE VIRTUAL TABLE IF NOT EXISTS ${table} USING fts5(
+            ${TRIGRAM_COLUMNS.join(',\n            ')},
+            tokenize = 'trigram case_sensitive 0'
+        )
+    `;
+}
+
+function rebuildSql(table = TRIGRAM_TABLE, source = 'products') {
+    return [
+        `DELETE FROM ${table}`,
+        `INSERT INTO ${table} (rowid, ${TRIGRAM_COLUMNS.join(', ')})
+         SELECT id, ${TRIGRAM_COLUMNS.join(', ')} FROM ${source}`,
+    ];
+}
+
+function deleteRowSql(table = TRIGRAM_TABLE, source = 'products') {
+    return `DELETE FROM ${table} WHERE rowid = (SELECT id FROM ${source} WHERE item_code = $item_code)`;
+}
+
+function insertRowSql(table = TRIGRAM_TABLE, source = 'products') {
+    return `INSERT INTO ${table} (rowid, ${TRIGRAM_COLUMNS.join(', ')})
+            SELECT id, ${TRIGRAM_COLUMNS.join(', ')} FROM ${source} WHERE item_code = $item_code`;
+}
+
+// Every term is matched as a substring; returns null unless all terms are
+// long enough to be answered from the index.
+function buildMatchExpression(query) {
+    if (typeof query !== 'string') return null;
+
+    const terms = query.split(/\s+/).filter(Boolean);
+    if (!terms.length || terms.some((term) => [...term].length < MIN_TERM_LENGTH)) {
+        return null;
+    }
+
+    return terms.map((term) => `"${term.replace(/"/g, '""')}"`).join(' AND ');
+}
+
+// condition as for fts.search()
+function search(db, query, limit = SEARCH_LIMIT, condition = null) {
+    const matchExpression = buildMatchExpression(query);
+    if (!matchExpression) return Promise.resolve(null);
+
+    return new Promise((resolve, reject) => {
+        db.all(
+            `SELECT p.* FROM ${TRIGRAM_TABLE}
+             JOIN products p ON p.id = ${TRIGRAM_TABLE}.rowid
+             WHERE ${TRIGRAM_TABLE} MATCH ?${condition ? ` AND ${condition.sql}` : ''}
+             ORDER BY rank
+             LIMIT ?`,
+            [matchExpression, ...(condition ? condition.params : []), limit],
+            (err, rows) => (err ? reject(err) : resolve(rows)),
+        );
+    });
+}
+
+function ensurePopulated(db) {
+    return fts.ensurePopulated(db, TRIGRAM_TABLE, rebuildSql());
+}
+
+module.exports = {
+    TABLE: TRIGRAM_TABLE,
+    TRIGRAM_TABLE,
+    TRIGRAM_COLUMNS,
+    MIN_TERM_LENGTH,
+    createTableSql,
+    rebuildSql,
+    deleteRowSql,
+    insertRowSql,
+    buildMatchExpression,
+    search,
+    ensurePopulated,
+};
@@ -4,39 +4,46 @@ const sqlite3 = require('sqlite3').verbose();
 const axios = require('axios');
 const FormData = require('form-data');
 const fs = require('fs');
+const os = require('os');
 const Redis = require('ioredis');
 const path = require('path');
-const zlib = require('zlib');
-const { promisify } = require('util');
-const gzip = promisify(zlib.gzip);
-const ungzip = promisify(zlib.gunzip);
+const fts = require('./search/fts');
+const trigram = require('./search/trigram');
+const memoryIndex = require('./search/memoryIndex');
+const barcodes = require('./search/barcodes');
+const stock = require('./search/stock');
+const { normalizeQuery, cacheIdentifier } = require('./search/normalize');
+const syncState = require('./sync/state');
+const { createSyncScheduler } = require('./sync/scheduler');
+const productSync = require('./sync/products');
+const { parseJsonArray } = require('./utils/jsonStream');
+const { createLogger } = require('./utils/logger');
+const { readRecentLogs } = require('./utils/logTail');
+const { createLru } = require('./cache/lru');
+const { createCodec } = require('./cache/codec');
+const { createSingleFlight } = require('./cache/singleFlight');
+const { createCacheStore } = require('./cache/store');
+const { createCacheWarmer } = require('./cache/warmer');
+const metrics = require('./metrics');
+const dbPragmas = require('./db/pragmas');
+const { createReadPool } = require('./db/readPool');
 require('dotenv').config();
 
 // Logging utility
 const LOG_FILE = path.join(__dirname, '..', 'logs', 'app.log');
 
-// Ensure logs directory exists
-if (!fs.existsSync(path.dirname(LOG_FILE))) {
-    fs.mkdirSync(path.dirname(LOG_FILE), { recursive: true });
-}
-
-function log(level, message, error = null) {
-    const timestamp = new Date().toISOString();
-    const logEntry = {
-        timestamp,
-        level,
-        message,
-        ...(error && { error: error.stack || error.message || error }),
-    };
-    
-    const logLine = JSON.stringify(logEntry) + '\n';
-    fs.appendFileSync(LOG_FILE, logLine);
-
+const logger = createLogger({
+    file: LOG_FILE,
+    level: process.env.LOG_LEVEL || 'info',
+    maxBytes: parseInt(process.env.LOG_MAX_BYTES, 10) || undefined,
+    maxFiles: parseInt(process.env.LOG_MAX_FILES, 10) || undefined,
+    rotateIntervalMs: process.env.LOG_ROTATE_HOURS !== undefined && process.env.LOG_ROTATE_HOURS !== ''
+        ? parseFloat(process.env.LOG_ROTATE_HOURS) * 60 * 60 * 1000
+        : undefined,
     // Also log to console in development
-    if (process.env.NODE_ENV !== 'production') {
-        console[level](message, error || '');
-    }
-}
+    console: process.env.NODE_ENV !== 'production',
+});
+const { log } = logger;
 
 // Error handling middleware
 function errorHandler(err, req, res, next) {
@@ -49,158 +56,163 @@ function errorHandler(err, req, res, next) {
 }
 
 // Function declarations first
-async function fetchAndStoreProducts(db) {
+function refreshMemoryIndex(db) {
+    return memoryIndex.rebuild(db)
+        .then(() => {
+            const { rows, tokens } = memoryIndex.stats();
+            log('info', `In-memory search index built: ${rows} products, ${tokens} tokens`);
+        })
+        .catch((error) => log('error', 'Error building in-memory search index:', error));
+}
+
+// Record how long a SQLite query took, for /metrics
+function timeQuery(operation, promise) {
+    return metrics.timed(metrics.sqliteQueryDuration, { operation }, promise);
+}
+
+const SEARCH_LIMIT = 100;
+
+// Answer a search from the fastest index available. stockFilter, if given,
+// is applied before the limit, so in-stock matches past the first page of
+// unfiltered results are still found.
+async function searchProducts(db, query, stockFilter = null) {
+    const endTimer = metrics.searchDuration.startTimer();
+    const condition = stockFilter ? stock.productCondition(stockFilter) : null;
+    let source = 'memory';
+    let rows = memoryIndex.search(query, stockFilter ? Infinity : SEARCH_LIMIT);
+    if (rows && stockFilter) {
+        // Every ranked candidate, narrowed to those in stock
+        const ids = await timeQuery('stock_filter', stock.filterInStock(db, rows.map((row) => row.id), stockFilter));
+        rows = rows.filter((row) => ids.has(row.id)).slice(0, SEARCH_LIMIT);
+    }
+    if (!rows) {
+        // In-memory index still loading, answer from the FTS index
+        source = 'fts';
+        rows = await timeQuery('search_fts', fts.search(db, query, SEARCH_LIMIT, condition));
+    }
+    if (!rows || !rows.length) {
+        // Word prefixes found nothing, try infix matches on item codes and barcodes
+        const infixRows = await timeQuery('search_trigram', trigram.search(db, query, SEARCH_LIMIT, condition));
+        if (infixRows) {
+            source = 'trigram';
+            rows = infixRows;
+        }
+    }
+    if (!rows) {
+        // Nothing indexable in the query (e.g. only punctuation), fall back to a scan
+        source = 'like';
+        rows = await timeQuery('search_like', new Promise((resolve, reject) => {
+            db.all(
+                `SELECT * FROM products p
+                 WHERE (name LIKE ?
+                    OR item_code LIKE ?
+                    OR barcodes LIKE ?
+                    OR description LIKE ?
+                    OR description2 LIKE ?
+                    OR extra_desc1 LIKE ?
+                    OR extra_desc2 LIKE ?)${condition ? ` AND ${condition.sql}` : ''}
+                 LIMIT ?`,
+                [...Array(7).fill(`%${query}%`), ...(condition ? condition.params : []), SEARCH_LIMIT],
+                (err, result) => (err ? reject(err) : resolve(result)),
+            );
+        }));
+    }
+    endTimer({ source });
+    return rows;
+}
+
+// Stream a DK API collection, parsed element by element instead of buffering it
+async function fetchFeed(resource) {
+    const data = new FormData();
+    const config = {
+        method: 'get',
+        maxBodyLength: Infinity,
+        url: `${process.env.DK_API_URL}${resource}`,
+        responseType: 'stream',
+        headers: {
+            Authorization: `Bearer ${process.env.DK_API_KEY}`,
+            ...data.getHeaders(),
+        },
+        data,
+    };
+
+    const response = await axios.request(config);
+    return parseJsonArray(response.data);
+}
+
+async function fetchAndStoreProducts(db, { mode = SYNC_MODE } = {}) {
+    const endTimer = metrics.syncDuration.startTimer({ mode });
     try {
-        log('info', 'Starting product fetch from API');
-        const data = new FormData();
-        const config = {
-            method: 'get',
-            maxBodyLength: Infinity,
-            url: `${process.env.DK_API_URL}Product`,
-            headers: {
-                Authorization: `Bearer ${process.env.DK_API_KEY}`,
-                ...data.getHeaders(),
-            },
-            data,
-        };
-
-        const response = await axios.request(config);
-        const products = response.data;
-        log('info', `Fetched ${products.length} products from API`);
-
-        return new Promise((resolve, reject) => {
-            db.serialize(() => {
-                db.run('BEGIN TRANSACTION');
-
-                db.run('DELETE FROM products', [], (deleteErr) => {
-                    if (deleteErr) {
-                        log('error', 'Error clearing products:', deleteErr);
-                        db.run('ROLLBACK');
-                        reject(deleteErr);
-                        return;
-                    }
-                    log('info', 'Cleared existing products');
-
-                    const stmt = db.prepare(`
-                        INSERT INTO products (
-                            record_id,
-                            item_code,
-                            name,
-                            description,
-                            description2,
-                            extra_desc1,
-                            extra_desc2,
-                            unit_price_with_tax,
-                            unit_price1,
-                            unit_price2,
-                            unit_price3,
-                            purchase_price,
-                            cost_price,
-                            currency_code,
-                            barcodes,
-                            categories,
-                            warehouse_data,
-                            inactive,
-                            allow_discount,
-                            max_discount_allowed,
-                            record_created,
-                            record_modified
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    `);
-
-                    let insertCount = 0;
-                    products.forEach((product) => {
-                        try {
-                            const name = [
-                                product.Description,
-                                product.Description2,
-                                product.ExtraDesc1
-                            ].filter(Boolean).join(' ').trim() || product.ItemCode || 'Unknown Product';
-
-                            stmt.run(
-                                product.RecordID || null,
-                                product.ItemCode || '',
-                                name,
-                                product.Description || null,
-                                product.Description2 || null,
-                                product.ExtraDesc1 || null,
-                                product.ExtraDesc2 || null,
-                                product.UnitPrice1WithTax || 0,
-                                product.UnitPrice1 || 0,
-                                product.UnitPrice2 || 0,
-                                product.UnitPrice3 || 0,
-                                product.PurchasePrice || 0,
-                                product.CostPrice || 0,
-                                product.CurrencyCode || 'ISK',
-                                JSON.stringify(product.Barcodes?.map((b) => b.Barcode) || []),
-                                JSON.stringify(product.Categories || []),
-                                JSON.stringify(product.Warehouses || []),
-                                product.Inactive ? 1 : 0,
-                                product.AllowDiscount ? 1 : 0,
-                                product.MaxDiscountAllowed || 0,
-                                product.RecordCreated || null,
-                                product.RecordModified || null
-                            );
-                            insertCount += 1;
-                        } catch (error) {
-                            log('error', `Error processing product ${product.ItemCode}:`, error);
-                        }
-                    });
+        log('info', `Starting ${mode} product fetch from API`);
+        const { SYNC_MODES } = productSync;
+        const products = await fetchFeed(mode === SYNC_MODES.STOCK ? DK_STOCK_RESOURCE : 'Product');
+
+        let result;
+        if (mode === SYNC_MODES.FULL) {
+            result = await productSync.storeFull(db, products, log);
+        } else if (mode === SYNC_MODES.STOCK) {
+            result = await productSync.storeStock(db, products, log);
+        } else {
+            result = await productSync.storeIncremental(db, products, log);
+        }
 
-                    stmt.finalize();
-                    db.run('COMMIT', (commitErr) => {
-                        if (commitErr) {
-                            log('error', 'Error committing transaction:', commitErr);
-                            db.run('ROLLBACK');
-                            reject(commitErr);
-                        } else {
-                            log('info', `Successfully inserted ${insertCount} products`);
-                            resolve();
-                        }
-                    });
-                });
-            });
+        ['inserted', 'updated', 'deleted'].forEach((change) => {
+            metrics.syncRows.inc({ mode: result.mode, change }, result[change]);
         });
+
+        if (result.mode === SYNC_MODES.STOCK) {
+            // Names, prices and barcodes are unchanged: patch stock in place and
+            // drop only the cached searches that include a changed product
+            const { changes, ...summary } = result;
+            if (changes.length) {
+                memoryIndex.updateRows(changes);
+                const dropped = await cacheUtils.invalidateProducts(changes.map(({ id }) => id));
+                log('info', `Stock sync invalidated ${dropped} cached searches`);
+            }
+            result = summary;
+        } else if (result.inserted || result.updated || result.deleted) {
+            // Swap in the new in-memory index before new-generation keys get filled
+            await refreshMemoryIndex(db);
+            await cacheUtils.bumpGeneration();
+            warmSearchCache();
+        }
+        endTimer({ status: 'success' });
+        return result;
     } catch (error) {
+        endTimer({ status: 'error' });
         log('error', 'Error in fetchAndStoreProducts:', error);
         throw error;
     }
 }
 
+// One sync as run by the scheduler: store, then record when it succeeded so
+// /api/last-update survives restarts
+async function runSync(mode) {
+    const result = await fetchAndStoreProducts(db, { mode });
+    lastUpdateTime = new Date();
+    await syncState.set(db, syncState.lastSyncKey(mode), lastUpdateTime.toISOString())
+        .catch((error) => log('error', 'Error saving last sync time:', error));
+    return result;
+}
+
+async function loadLastUpdate(db) {
+    try {
+        const stored = await syncState.lastSync(db);
+        if (stored) {
+            lastUpdateTime = new Date(stored);
+        }
+    } catch (error) {
+        log('error', 'Error loading last sync time:', error);
+    }
+}
+
 // Initialize database tables
 async function initializeDatabase(db, isNewDatabase) {
     return new Promise((resolve, reject) => {
         db.serialize(() => {
             try {
                 // Create products table with expanded fields
-                db.run(`
-                    CREATE TABLE IF NOT EXISTS products (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        record_id INTEGER,
-                        item_code TEXT UNIQUE NOT NULL,
-                        name TEXT NOT NULL,
-                        description TEXT,
-                        description2 TEXT,
-                        extra_desc1 TEXT,
-                        extra_desc2 TEXT,
-                        unit_price_with_tax REAL,
-                        unit_price1 REAL,
-                        unit_price2 REAL,
-                        unit_price3 REAL,
-                        purchase_price REAL,
-                        cost_price REAL,
-                        currency_code TEXT,
-                        barcodes TEXT,
-                        categories TEXT,
-                        warehouse_data TEXT,
-                        inactive BOOLEAN DEFAULT 0,
-                        allow_discount BOOLEAN DEFAULT 1,
-                        max_discount_allowed REAL,
-                        record_created DATETIME,
-                        record_modified DATETIME,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                `, (err) => {
+                db.run(productSync.createTableSql(), (err) => {
                     if (err) {
                         console.error('Error creating products table:', err);
                         reject(err);
@@ -210,14 +222,35 @@ async function initializeDatabase(db, isNewDatabase) {
                 });
 
                 // Create indexes for faster searching
-                db.run('CREATE INDEX IF NOT EXISTS idx_item_code ON products(item_code)');
-                db.run('CREATE INDEX IF NOT EXISTS idx_name ON products(name)');
-                db.run('CREATE INDEX IF NOT EXISTS idx_barcodes ON products(barcodes)');
-                db.run('CREATE INDEX IF NOT EXISTS idx_categories ON products(categories)');
+                productSync.ensureIndexes(db)
+                    .catch((error) => log('error', 'Error creating product indexes:', error));
+
+                // Sync bookkeeping
+                db.run(syncState.createTableSql());
+
+                // Full-text, trigram, barcode and stock tables used by /api/search
+                productSync.DERIVED_TABLES.forEach((index) => {
+                    db.run(index.createTableSql(), (err) => {
+                        if (err) {
+                            console.error('Error creating search index:', err);
+                            reject(err);
+                            return;
+                        }
+                        if (index.createIndexesSql) {
+                            productSync.ensureIndexes(db, index)
+                                .catch((error) => log('error', `Error creating ${index.TABLE} indexes:`, error));
+                        }
+                        index.ensurePopulated(db)
+                            .then((rebuilt) => {
+                                if (rebuilt) log('info', `${index.TABLE} rebuilt from products`);
+                            })
+                            .catch((error) => log('error', 'Error populating search index:', error));
+                    });
+                });
 
                 if (isNewDatabase) {
                     console.log('New database detected, fetching initial products...');
-                    fetchAndStoreProducts(db)
+                    syncScheduler.request(SYNC_MODE)
                         .then(() => {
                             console.log('Initial product sync completed');
                             resolve();
@@ -240,16 +273,67 @@ async function initializeDatabase(db, isNewDatabase) {
 const app = express();
 const port = process.env.PORT || 3000;
 const DB_FILE = process.env.DB_FILE || './database.sqlite';
+const SYNC_MODE = process.env.SYNC_MODE || productSync.SYNC_MODES.INCREMENTAL;
+// DK resource read by stock syncs; only ItemCode and Warehouses are used
+const DK_STOCK_RESOURCE = process.env.DK_STOCK_RESOURCE || 'Product';
+// Reading stock from the full Product feed costs as much as an incremental
+// sync, so stock syncs are only scheduled by default from a narrower feed
+const DEFAULT_STOCK_SYNC_INTERVAL = DK_STOCK_RESOURCE === 'Product' ? 0 : 120;
+
+// Seconds from the environment, falling back to a default; 0 disables
+function intervalFromEnv(name, defaultSeconds) {
+    const value = process.env[name];
+    const seconds = value !== undefined && value !== '' ? parseFloat(value) : defaultSeconds;
+    return Number.isFinite(seconds) && seconds > 0 ? seconds * 1000 : 0;
+}
+
+// Scheduled syncs: the catalog (in SYNC_MODE) and, given a stock feed, stock only
+const SYNC_SCHEDULE = {
+  [SYNC_MODE]: intervalFromEnv('CATALOG_SYNC_INTERVAL', 60 * 60),
+  [productSync.SYNC_MODES.STOCK]: intervalFromEnv('STOCK_SYNC_INTERVAL', DEFAULT_STOCK_SYNC_INTERVAL),
+};
+const SYNC_JITTER = Number.isFinite(parseFloat(process.env.SYNC_JITTER))
+  ? parseFloat(process.env.SYNC_JITTER)
+  : 0.1;
+// WAL, synchronous, mmap, cache and busy timeout; see src/db/pragmas.js
+const DB_PRAGMAS = dbPragmas.settingsFromEnv();
+// Read-only connections in worker threads serving searches; 0 reads through the writer
+const READ_POOL_SIZE = process.env.SQLITE_READ_POOL_SIZE !== undefined && process.env.SQLITE_READ_POOL_SIZE !== ''
+    ? parseInt(process.env.SQLITE_READ_POOL_SIZE, 10)
+    : Math.min(os.cpus().length, 4);
 
 // Cache configuration
 const CACHE_CONFIG = {
   PREFIX: 'ss:',
-  DEFAULT_TTL: 300, // 5 minutes
-  COMPRESSED_MIN_SIZE: 1024, // Compress if larger than 1KB
+  DEFAULT_TTL: 300, // 5 minutes; soft TTL, past it entries are served stale and refreshed
+  HARD_TTL: 1800, // 30 minutes; past it entries are gone and requests wait for the database
+  NEGATIVE_TTL: parseInt(process.env.CACHE_NEGATIVE_TTL, 10) || 60, // Empty results (typos, misreads)
+  CODEC: process.env.CACHE_CODEC || 'deflate-raw', // identity, gzip, deflate-raw, brotli
+  // Compress if larger than this; defaults to the codec's own threshold
+  COMPRESSED_MIN_SIZE: parseInt(process.env.CACHE_COMPRESSED_MIN_SIZE, 10) || undefined,
+  LOCAL: {
+    MAX_ENTRIES: parseInt(process.env.CACHE_LOCAL_MAX_ENTRIES, 10) || 1000,
+    MAX_BYTES: parseInt(process.env.CACHE_LOCAL_MAX_BYTES, 10) || 32 * 1024 * 1024, // 32MB
+    TTL: 60 // Entries read back from Redis stay local for at most 1 minute
+  },
+  // Bumped after every catalog change; part of every key, so a bump orphans
+  // all older entries at once and they age out of Redis on their own
+  GENERATION_KEY: 'catalog:generation',
+  // Sorted set of normalized search queries by how often they were run
+  QUERY_STATS_KEY: 'stats:queries',
+  INVALIDATE_BATCH_SIZE: 500, // Products per SUNION/DEL round-trip
+  WARM: {
+    TOP_QUERIES: parseInt(process.env.CACHE_WARM_TOP_QUERIES, 10) || 100,
+    MAX_TRACKED_QUERIES: 5000,
+    TRIM_EVERY: 100, // Recorded queries between trims of the ranking
+    DELAY_MS: 25 // Pause between warmed queries so live searches go first
+  },
   CATEGORIES: {
     PRODUCT: 'product:',
     SEARCH: 'search:',
-    INVENTORY: 'inventory:'
+    INVENTORY: 'inventory:',
+    // Per product: the search entries that include it, for stock invalidation
+    PRODUCT_REFS: 'refs:'
   }
 };
 
@@ -274,63 +358,57 @@ const redis = new Redis({
   }
 });
 
-// Redis helper functions
-const cacheUtils = {
-  generateKey: (category, identifier) => {
-    return `${CACHE_CONFIG.PREFIX}${category}${identifier}`;
-  },
+// In-process tier in front of Redis, holding serialized JSON buffers
+const localCache = createLru({
+  maxEntries: CACHE_CONFIG.LOCAL.MAX_ENTRIES,
+  maxBytes: CACHE_CONFIG.LOCAL.MAX_BYTES
+});
 
-  async set(key, data, ttl = CACHE_CONFIG.DEFAULT_TTL) {
-    try {
-      const stringData = JSON.stringify(data);
-      let finalData = stringData;
-
-      // Compress if data is large
-      if (stringData.length > CACHE_CONFIG.COMPRESSED_MIN_SIZE) {
-        const compressed = await gzip(stringData);
-        finalData = compressed.toString('base64');
-        key = `${key}:compressed`;
-      }
+// Values are stored as raw buffers with a one-byte codec header
+const cacheCodec = createCodec({
+  name: CACHE_CONFIG.CODEC,
+  minSize: CACHE_CONFIG.COMPRESSED_MIN_SIZE
+});
 
-      await redis.setex(key, ttl, finalData);
-      log('debug', `Cache set: ${key}`);
-    } catch (error) {
-      log('error', `Cache set error for key ${key}:`, error);
-    }
-  },
+// In-flight search executions, keyed by cache key
+const searchFlight = createSingleFlight();
 
-  async get(key) {
-    try {
-      const data = await redis.get(key);
-      if (!data) {
-        // Try compressed version
-        const compressedData = await redis.get(`${key}:compressed`);
-        if (compressedData) {
-          const buffer = Buffer.from(compressedData, 'base64');
-          const decompressed = await ungzip(buffer);
-          return JSON.parse(decompressed.toString());
-        }
-        return null;
-      }
-      return JSON.parse(data);
-    } catch (error) {
-      log('error', `Cache get error for key ${key}:`, error);
-      return null;
-    }
-  },
+// Local tier, Redis and catalog generations; see src/cache/store.js
+const cacheUtils = createCacheStore({
+  redis,
+  config: CACHE_CONFIG,
+  localCache,
+  codec: cacheCodec,
+  log,
+});
 
-  async invalidate(key) {
-    try {
-      await Promise.all([
-        redis.del(key),
-        redis.del(`${key}:compressed`)
-      ]);
-      log('debug', `Cache invalidated: ${key}`);
-    } catch (error) {
-      log('error', `Cache invalidation error for key ${key}:`, error);
-    }
-  }
-};
+function searchCacheKey(query) {
+  return cacheUtils.generateKey(CACHE_CONFIG.CATEGORIES.SEARCH, cacheIdentifier(query));
+}
+
+// Run a search and cache the results. Identical concurrent calls (misses,
+// stale refreshes, the warmer) share one query and one cache write.
+function refreshSearch(query, cacheKey = searchCacheKey(query)) {
+  return searchFlight.run(cacheKey, async () => {
+    const results = await searchProducts(reader(), query);
+    await cacheUtils.set(cacheKey, results);
+    await cacheUtils.trackProducts(cacheKey, results);
+    return results;
+  });
+}
+
+// Re-runs the most frequent searches after a restart or a catalog change
+const cacheWarmer = createCacheWarmer({
+  store: cacheUtils,
+  refresh: (query) => refreshSearch(query),
+  topQueries: CACHE_CONFIG.WARM.TOP_QUERIES,
+  delayMs: CACHE_CONFIG.WARM.DELAY_MS,
+  log,
+});
+
+function warmSearchCache() {
+  return cacheWarmer.warm();
+}
 
 // Redis event handlers
 redis.on('error', (err) => {
@@ -343,6 +421,7 @@ redis.on('connect', () => {
 
 redis.on('ready', () => {
   log('info', 'Redis is ready to accept commands');
+  cacheUtils.loadGeneration();
 });
 
 redis.on('close', () => {
@@ -353,16 +432,60 @@ redis.on('reconnecting', () => {
   log('warn', 'Redis reconnecting...');
 });
 
-// Track last update time
+// Time of the last successful sync, persisted in sync_state
 let lastUpdateTime = null;
 
+// All syncs, scheduled or manual, go through here: one at a time, and
+// requests covered by a running or queued sync join it
+const syncScheduler = createSyncScheduler({
+  run: runSync,
+  intervals: SYNC_SCHEDULE,
+  jitter: SYNC_JITTER,
+  log,
+});
+
 // Middleware
+// Request latency by matched route, for /metrics
+app.use((req, res, next) => {
+  const endTimer = metrics.httpRequestDuration.startTimer({ method: req.method });
+  res.on('finish', () => {
+    endTimer({
+      route: req.route ? `${req.baseUrl}${req.route.path}` : 'other',
+      status: res.statusCode,
+    });
+  });
+  next();
+});
 app.use(cors());
 app.use(express.json());
 app.use(express.static(path.join(__dirname, 'public')));
 app.use(errorHandler);
 
 // Database setup
+// Searches go to the read pool once it is started, the writer until then and
+// while every read worker is down
+let readPool = null;
+function reader() {
+    return readPool && readPool.available() ? readPool : db;
+}
+
+function startReadPool() {
+    // Other connections to ':memory:' would each get their own empty database
+    if (READ_POOL_SIZE <= 0 || DB_FILE === ':memory:') {
+        return;
+    }
+    readPool = createReadPool({
+        file: DB_FILE,
+        size: READ_POOL_SIZE,
+        statements: dbPragmas.readerPragmaStatements(DB_PRAGMAS),
+        log,
+        onStatementLookup: (cached) => metrics.sqliteStatementCache.inc({ result: cached ? 'hit' : 'miss' }),
+    });
+    log('info', `SQLite read pool started with ${READ_POOL_SIZE} connections`);
+}
+
+// Checked before opening, which creates the file
+const isNewDatabase = !fs.existsSync(DB_FILE);
 const db = new sqlite3.Database(DB_FILE, async (err) => {
     if (err) {
         log('error', 'Error connecting to the database:', err);
@@ -370,9 +493,20 @@ const db = new sqlite3.Database(DB_FILE, async (err) => {
     } else {
         log('info', 'Connected to SQLite database');
         try {
-            const isNewDatabase = !fs.existsSync(DB_FILE);
+            const effective = await dbPragmas.applyPragmas(db, DB_PRAGMAS);
+            log('info', `SQLite settings: ${JSON.stringify(effective)}`);
+            const ignored = dbPragmas.mismatches(DB_PRAGMAS, effective);
+            if (ignored.length) {
+                log('warn', `SQLite did not apply requested settings: ${ignored.join(', ')}`);
+            }
+
             await initializeDatabase(db, isNewDatabase);
             log('info', 'Database initialization completed');
+            // Started once the schema exists; read-only connections cannot create it
+            startReadPool();
+            await loadLastUpdate(db);
+            syncScheduler.start();
+            refreshMemoryIndex(db).then(() => warmSearchCache());
         } catch (error) {
             log('error', 'Database initialization failed:', error);
             process.exit(1);
@@ -381,16 +515,33 @@ const db = new sqlite3.Database(DB_FILE, async (err) => {
 });
 
 // View logs endpoint
-app.get('/logs', (req, res) => {
+const MAX_LOG_LINES = 10000;
+
+function parseLogTime(value) {
+    if (value === undefined || value === '') return undefined;
+    const time = Date.parse(value);
+    return Number.isNaN(time) ? null : time;
+}
+
+app.get('/logs', async (req, res) => {
     try {
-        // Read last 1000 lines by default
-        const lines = req.query.lines ? parseInt(req.query.lines, 10) : 1000;
-        const logs = fs.readFileSync(LOG_FILE, 'utf8')
-            .split('\n')
-            .filter(line => line.trim())
-            .slice(-lines)
-            .map(line => JSON.parse(line))
-            .reverse(); // Most recent first
+        // Last 1000 lines by default; optional ?level=warn&from=<ISO>&to=<ISO>
+        const lines = Math.min(parseInt(req.query.lines, 10) || 1000, MAX_LOG_LINES);
+        const level = req.query.level || undefined;
+        const since = parseLogTime(req.query.from);
+        const until = parseLogTime(req.query.to);
+        if (since === null || until === null) {
+            return res.status(400).json({ error: "Invalid 'from' or 'to' time" });
+        }
+
+        // Tail-read the log files instead of loading them whole; most recent first
+        logger.flush();
+        const logs = await readRecentLogs(logger.files(), {
+            limit: lines,
+            level,
+            since,
+            until,
+        });
 
         // If HTML is requested, render a simple log viewer
         if (req.headers.accept?.includes('text/html')) {
@@ -411,7 +562,7 @@ app.get('/logs', (req, res) => {
                     <div class="container-fluid py-3">
                         <h1 class="mb-4">Application Logs</h1>
                         <div class="mb-3">
-                            <select class="form-select d-inline-block w-auto" onchange="window.location.href='?lines='+this.value">
+                            <select class="form-select d-inline-block w-auto" onchange="const params = new URLSearchParams(window.location.search); params.set('lines', this.value); window.location.search = params">
                                 <option value="100" ${lines === 100 ? 'selected' : ''}>Last 100 lines</option>
                                 <option value="500" ${lines === 500 ? 'selected' : ''}>Last 500 lines</option>
                                 <option value="1000" ${lines === 1000 ? 'selected' : ''}>Last 1000 lines</option>
@@ -440,6 +591,12 @@ app.get('/logs', (req, res) => {
     }
 });
 
+// Prometheus metrics
+app.get('/metrics', (req, res) => {
+    res.set('Content-Type', metrics.registry.contentType);
+    res.send(metrics.registry.render());
+});
+
 // Default route
 app.get('/', (req, res) => {
     res.sendFile(path.join(__dirname, 'public', 'search.html'));
@@ -448,12 +605,17 @@ app.get('/', (req, res) => {
 // Force refresh endpoint
 app.post('/api/refresh', async (req, res) => {
     try {
-        await fetchAndStoreProducts(db);
-        lastUpdateTime = new Date();
+        // ?mode=full or ?mode=stock, otherwise the configured SYNC_MODE
+        const mode = Object.values(productSync.SYNC_MODES).includes(req.query.mode)
+            ? req.query.mode
+            : SYNC_MODE;
+        // Joins a sync already running or queued that covers this mode
+        const result = await syncScheduler.request(mode);
         res.json({
             success: true,
             message: 'Data refreshed successfully',
             lastUpdate: lastUpdateTime,
+            changes: result,
         });
     } catch (error) {
         log('error', 'Refresh error:', error);
@@ -469,45 +631,101 @@ app.get('/api/last-update', (req, res) => {
     res.json({ lastUpdate: lastUpdateTime });
 });
 
+// Exact barcode lookup
+app.get('/api/barcode/:code', async (req, res) => {
+  try {
+    const { code } = req.params;
+    if (!barcodes.isBarcode(code)) {
+      return res.status(400).json({ error: 'Barcode must be digits only' });
+    }
+
+    const product = await timeQuery('barcode_lookup', barcodes.lookup(reader(), code));
+    if (!product) {
+      return res.status(404).json({ error: 'Product not found' });
+    }
+    res.json(product);
+  } catch (error) {
+    log('error', 'Barcode lookup error:', error);
+    res.status(500).json({ error: 'Internal server error' });
+  }
+});
+
+// ?inStock=<warehouse>&minQty=<n> stock filter for /api/search; null when
+// neither is given, { error } when invalid
+function parseStockFilter({ inStock, minQty }) {
+  if (inStock === undefined && minQty === undefined) {
+    return null;
+  }
+  if (inStock !== undefined && !stock.isWarehouse(inStock)) {
+    return { error: 'inStock must be a warehouse code' };
+  }
+  const quantity = minQty === undefined ? undefined : Number(minQty);
+  if (quantity !== undefined && (minQty === '' || !Number.isFinite(quantity))) {
+    return { error: 'minQty must be a number' };
+  }
+  return { warehouse: inStock, minQty: quantity };
+}
+
+// Narrow rows to products whose stock matches the filter
+async function applyStockFilter(rows, filter) {
+  const ids = await timeQuery('stock_filter', stock.filterInStock(reader(), rows.map((row) => row.id), filter));
+  return rows.filter((row) => ids.has(row.id));
+}
+
+// Search with a stock filter. Not cached: stock syncs change which products
+// match far more often than the catalog changes, and per-product
+// invalidation cannot see a product that newly came into stock. Identical
+// concurrent requests still share one query.
+function searchInStock(query, filter) {
+  const flightKey = `${searchCacheKey(query)}|stock:${filter.warehouse || ''}:${filter.minQty ?? ''}`;
+  return searchFlight.run(flightKey, () => searchProducts(reader(), query, filter));
+}
+
 // Search endpoint
 app.get('/api/search', async (req, res) => {
   try {
-    const { query } = req.query;
+    const query = normalizeQuery(req.query.query);
+    const stockFilter = parseStockFilter(req.query);
+    if (stockFilter?.error) {
+      return res.status(400).json({ error: stockFilter.error });
+    }
     if (!query) {
+      // "What is in stock in bg1" needs no search terms
+      if (stockFilter?.warehouse) {
+        return res.json(await timeQuery('stock_list', stock.inStock(reader(), stockFilter)));
+      }
       return res.status(400).json({ error: 'Query parameter is required' });
     }
 
-    const cacheKey = cacheUtils.generateKey(CACHE_CONFIG.CATEGORIES.SEARCH, query);
-    const cachedResult = await cacheUtils.get(cacheKey);
+    // Scanner input: a primary key lookup beats any cache round-trip
+    if (barcodes.isBarcode(query)) {
+      const product = await timeQuery('barcode_lookup', barcodes.lookup(reader(), query));
+      if (product) {
+        return res.json(stockFilter ? await applyStockFilter([product], stockFilter) : [product]);
+      }
+    }
 
-    if (cachedResult) {
-      log('info', `Cache hit for search: ${query}`);
-      return res.json(cachedResult);
+    cacheUtils.recordQuery(query);
+
+    if (stockFilter) {
+      return res.json(await searchInStock(query, stockFilter));
     }
 
-    // Simplified query without JSON functions
-    db.all(
-      `SELECT * FROM products 
-       WHERE name LIKE ? 
-         OR item_code LIKE ? 
-         OR barcodes LIKE ?
-         OR description LIKE ?
-         OR description2 LIKE ?
-         OR extra_desc1 LIKE ?
-         OR extra_desc2 LIKE ?
-       LIMIT 100`,
-      Array(7).fill(`%${query}%`),
-      async (err, rows) => {
-        if (err) {
-          log('error', 'Database error:', err);
-          return res.status(500).json({ error: 'Database error' });
-        }
+    const cacheKey = searchCacheKey(query);
+    const refresh = () => refreshSearch(query, cacheKey);
 
-        // Cache the results
-        await cacheUtils.set(cacheKey, rows);
-        res.json(rows);
+    const cachedResult = await cacheUtils.getEntry(cacheKey);
+
+    if (cachedResult) {
+      if (cachedResult.stale) {
+        // Serve the stale copy now and repopulate it in the background
+        refresh().catch((error) => log('error', `Background refresh error for search: ${query}`, error));
       }
-    );
+      log('info', `Cache ${cachedResult.stale ? 'stale hit' : 'hit'} for search: ${query}`);
+      return res.type('json').send(cachedResult.buffer);
+    }
+
+    res.json(await refresh());
   } catch (error) {
     log('error', 'Search error:', error);
     res.status(500).json({ error: 'Internal server error' });
@@ -521,6 +739,7 @@ app.listen(port, () => {
 
 // Process termination handling
 process.on('SIGTERM', async () => {
+  syncScheduler.stop();
   try {
     await Promise.all([
       new Promise((resolve) => {
@@ -529,6 +748,7 @@ process.on('SIGTERM', async () => {
           resolve();
         });
       }),
+      readPool ? readPool.close() : Promise.resolve(),
       new Promise((resolve) => {
         db.close(() => {
           log('info', 'Database connection closed.');
@@ -536,6 +756,7 @@ process.on('SIGTERM', async () => {
         });
       })
     ]);
+    await logger.close();
     process.exit(0);
   } catch (error) {
     log('error', 'Error during shutdown:', error);
@@ -543,5 +764,10 @@ process.on('SIGTERM', async () => {
   }
 });
 
+// Write out anything still queued, whatever the reason for exiting
+process.on('exit', () => {
+  logger.flushSync();
+});
+
 // Export for testing
 module.exports = { app, redis, db }; 
\ No newline at end of file
@@ -0,0 +1,506 @@
+// Writes the DK Product feed into SQLite, either as a full reload or as an
+// incremental diff against the stored rows.
+//
+// A full reload never empties the live tables. It loads products_staging
+// (and a staging copy of every derived table), indexes it, and then renames
+// the staging tables into place in one short transaction.
+
+const fts = require('../search/fts');
+const trigram = require('../search/trigram');
+const barcodes = require('../search/barcodes');
+const stock = require('../search/stock');
+const syncState = require('./state');
+const transaction = require('../db/transaction');
+const { inBatches } = require('../utils/jsonStream');
+const { sqliteQueryDuration, timed } = require('../metrics');
+
+// Tables derived from products, kept in step on every sync
+const DERIVED_TABLES = [fts, trigram, barcodes, stock];
+
+const PRODUCTS_TABLE = 'products';
+const STAGING_SUFFIX = '_staging';
+const RETIRED_SUFFIX = '_old';
+
+// Index names cannot be renamed, so staging tables alternate between the
+// plain names and these suffixed ones.
+const INDEXED_COLUMNS = ['item_code', 'name', 'barcodes', 'categories'];
+const ALTERNATE_INDEX_SUFFIX = '_alt';
+
+// Products held in memory at once while streaming the feed into SQLite
+const BATCH_SIZE = 500;
+
+const SYNC_MODES = {
+    FULL: 'full',
+    INCREMENTAL: 'incremental',
+    STOCK: 'stock', // Warehouse quantities only, see storeStock()
+};
+
+const PRODUCT_COLUMNS = [
+    'record_id',
+    'item_code',
+    'name',
+    'description',
+    'description2',
+    'extra_desc1',
+    'extra_desc2',
+    'unit_price_with_tax',
+    'unit_price1',
+    'unit_price2',
+    'unit_price3',
+    'purchase_price',
+    'cost_price',
+    'currency_code',
+    'barcodes',
+    'categories',
+    'warehouse_data',
+    'inactive',
+    'allow_discount',
+    'max_discount_allowed',
+    'record_created',
+    'record_modified',
+];
+
+const ITEM_CODE = PRODUCT_COLUMNS.indexOf('item_code');
+const RECORD_MODIFIED = PRODUCT_COLUMNS.indexOf('record_modified');
+
+function insertSql(table = PRODUCTS_TABLE) {
+    return `
+        INSERT INTO ${table} (${PRODUCT_COLUMNS.join(', ')})
+        VALUES (${PRODUCT_COLUMNS.map(() => '?').join(', ')})
+    `;
+}
+
+// Insert into a staging table keeping the live id of every item code the
+// catalog already has, since warehouse_stock, product_barcodes, the cache's
+// product references and the in-memory index all key on it. Bound with the
+// item code first, then the row.
+function stagingInsertSql(table) {
+    return `
+        INSERT INTO ${table} (id, ${PRODUCT_COLUMNS.join(', ')})
+        VALUES ((SELECT id FROM ${PRODUCTS_TABLE} WHERE item_code = ?), ${PRODUCT_COLUMNS.map(() => '?').join(', ')})
+    `;
+}
+
+// New products in a staging table get ids above any the live table has handed
+// out, so an id is never reused for a different product
+function seedSequenceSql(table) {
+    return `
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT '${table}', MAX(
+            COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '${PRODUCTS_TABLE}'), 0),
+            COALESCE((SELECT MAX(id) FROM ${PRODUCTS_TABLE}), 0)
+        )
+    `;
+}
+
+const UPSERT_SQL = `${insertSql()}
+    ON CONFLICT(item_code) DO UPDATE SET
+    ${PRODUCT_COLUMNS.filter((column) => column !== 'item_code')
+        .map((column) => `${column} = excluded.${column}`)
+        .join(',\n    ')}
+`;
+
+function createTableSql(table = PRODUCTS_TABLE) {
+    return `
+        CREATE TABLE IF NOT EXISTS ${table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            record_id INTEGER,
+            item_code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            description2 TEXT,
+            extra_desc1 TEXT,
+            extra_desc2 TEXT,
+            unit_price_with_tax REAL,
+            unit_price1 REAL,
+            unit_price2 REAL,
+            unit_price3 REAL,
+            purchase_price REAL,
+            cost_price REAL,
+            currency_code TEXT,
+            barcodes TEXT,
+            categories TEXT,
+            warehouse_data TEXT,
+            inactive BOOLEAN DEFAULT 0,
+            allow_discount BOOLEAN DEFAULT 1,
+            max_discount_allowed REAL,
+            record_created DATETIME,
+            record_modified DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    `;
+}
+
+function createIndexesSql(table = PRODUCTS_TABLE, suffix = '') {
+    return INDEXED_COLUMNS.map((column) => (
+        `CREATE INDEX IF NOT EXISTS idx_${column}${suffix} ON ${table}(${column})`
+    ));
+}
+
+// Index name suffix currently used by the live products table
+function liveIndexSuffix(db) {
+    return new Promise((resolve, reject) => {
+        db.get(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name = ? AND tbl_name = ?",
+            [`idx_${INDEXED_COLUMNS[0]}${ALTERNATE_INDEX_SUFFIX}`, PRODUCTS_TABLE],
+            (err, row) => (err ? reject(err) : resolve(row ? ALTERNATE_INDEX_SUFFIX : '')),
+        );
+    });
+}
+
+// Indexes of the live products table, or of one derived table that has its
+// own (derived tables share the products table's suffix)
+async function ensureIndexes(db, derived = null) {
+    const suffix = await liveIndexSuffix(db);
+    const statements = derived
+        ? derived.createIndexesSql(derived.TABLE, suffix)
+        : createIndexesSql(PRODUCTS_TABLE, suffix);
+    await Promise.all(statements.map((sql) => new Promise((resolve, reject) => {
+        db.run(sql, (err) => (err ? reject(err) : resolve()));
+    })));
+}
+
+// warehouse_data column value for a DK Product (or stock) record
+function warehouseData(product) {
+    return JSON.stringify(product.Warehouses || []);
+}
+
+// Map a DK Product record to column values in PRODUCT_COLUMNS order
+function toRow(product) {
+    const name = [
+        product.Description,
+        product.Description2,
+        product.ExtraDesc1,
+    ].filter(Boolean).join(' ').trim() || product.ItemCode || 'Unknown Product';
+
+    return [
+        product.RecordID || null,
+        product.ItemCode || '',
+        name,
+        product.Description || null,
+        product.Description2 || null,
+        product.ExtraDesc1 || null,
+        product.ExtraDesc2 || null,
+        product.UnitPrice1WithTax || 0,
+        product.UnitPrice1 || 0,
+        product.UnitPrice2 || 0,
+        product.UnitPrice3 || 0,
+        product.PurchasePrice || 0,
+        product.CostPrice || 0,
+        product.CurrencyCode || 'ISK',
+        JSON.stringify(product.Barcodes?.map((b) => b.Barcode) || []),
+        JSON.stringify(product.Categories || []),
+        warehouseData(product),
+        product.Inactive ? 1 : 0,
+        product.AllowDiscount ? 1 : 0,
+        product.MaxDiscountAllowed || 0,
+        product.RecordCreated || null,
+        product.RecordModified || null,
+    ];
+}
+
+function toRows(products, log) {
+    const rows = [];
+    products.forEach((product) => {
+        try {
+            rows.push(toRow(product));
+        } catch (error) {
+            log('error', `Error processing product ${product?.ItemCode}:`, error);
+        }
+    });
+    return rows;
+}
+
+// ISO timestamps compare correctly as strings
+function laterOf(a, b) {
+    return b && (!a || b > a) ? b : a;
+}
+
+function maxRecordModified(rows, since = null) {
+    return rows.reduce((max, row) => laterOf(max, row[RECORD_MODIFIED]), since);
+}
+
+function sameValue(stored, incoming) {
+    if (stored === null || stored === undefined) return incoming === null || incoming === undefined;
+    return stored === incoming;
+}
+
+// Queue statements inside one transaction, timed for /metrics. Commits only
+// if every statement succeeded, otherwise rolls back and rejects with the
+// first error.
+function runTransaction(db, queueStatements) {
+    const committed = transaction.runTransaction(db, queueStatements);
+    return timed(sqliteQueryDuration, { operation: 'sync_transaction' }, committed);
+}
+
+function recordWatermark(db, watermark, track) {
+    if (watermark) {
+        db.run(syncState.setSql(), [syncState.KEYS.MAX_RECORD_MODIFIED, watermark], track);
+    }
+}
+
+function runStatement(db, sql) {
+    return timed(sqliteQueryDuration, { operation: 'sync_statement' }, new Promise((resolve, reject) => {
+        db.run(sql, (err) => (err ? reject(err) : resolve()));
+    }));
+}
+
+// Run every row through one prepared statement and wait for all of them
+function runBatch(stmt, rows) {
+    const batch = Promise.all(rows.map((row) => new Promise((resolve, reject) => {
+        stmt.run(row, (err) => (err ? reject(err) : resolve()));
+    })));
+    return timed(sqliteQueryDuration, { operation: 'sync_insert_batch' }, batch);
+}
+
+function prepare(db, sql) {
+    return new Promise((resolve, reject) => {
+        const stmt = db.prepare(sql, (err) => (err ? reject(err) : resolve(stmt)));
+    });
+}
+
+function finalize(stmt) {
+    return new Promise((resolve, reject) => {
+        stmt.finalize((err) => (err ? reject(err) : resolve()));
+    });
+}
+
+// Replace the whole catalog and rebuild every derived table. `products` may be
+// an array or an async iterable streaming the feed; it is consumed in batches.
+async function storeFull(db, products, log) {
+    const tables = [PRODUCTS_TABLE, ...DERIVED_TABLES.map((table) => table.TABLE)];
+    const staging = (table) => `${table}${STAGING_SUFFIX}`;
+    const retired = (table) => `${table}${RETIRED_SUFFIX}`;
+    const stagingIndexSuffix = (await liveIndexSuffix(db)) ? '' : ALTERNATE_INDEX_SUFFIX;
+    let inserted = 0;
+    let watermark = null;
+
+    // Load and index the staging tables, the live ones stay readable throughout
+    await runStatement(db, 'BEGIN TRANSACTION');
+    try {
+        for (const table of tables) {
+            await runStatement(db, `DROP TABLE IF EXISTS ${staging(table)}`);
+            await runStatement(db, `DROP TABLE IF EXISTS ${retired(table)}`);
+        }
+        await runStatement(db, createTableSql(staging(PRODUCTS_TABLE)));
+        await runStatement(db, seedSequenceSql(staging(PRODUCTS_TABLE)));
+
+        const stmt = await prepare(db, stagingInsertSql(staging(PRODUCTS_TABLE)));
+        try {
+            for await (const batch of inBatches(products, BATCH_SIZE)) {
+                const rows = toRows(batch, log);
+                await runBatch(stmt, rows.map((row) => [row[ITEM_CODE], ...row]));
+                inserted += rows.length;
+                watermark = maxRecordModified(rows, watermark);
+            }
+        } finally {
+            await finalize(stmt);
+        }
+
+        for (const sql of createIndexesSql(staging(PRODUCTS_TABLE), stagingIndexSuffix)) {
+            await runStatement(db, sql);
+        }
+        for (const table of DERIVED_TABLES) {
+            await runStatement(db, table.createTableSql(staging(table.TABLE)));
+            for (const sql of table.rebuildSql(staging(table.TABLE), staging(PRODUCTS_TABLE))) {
+                await runStatement(db, sql);
+            }
+            for (const sql of table.createIndexesSql?.(staging(table.TABLE), stagingIndexSuffix) || []) {
+                await runStatement(db, sql);
+            }
+        }
+        await runStatement(db, 'COMMIT');
+    } catch (error) {
+        await runStatement(db, 'ROLLBACK').catch(() => {});
+        throw error;
+    }
+    log('info', `Loaded ${inserted} products into staging tables`);
+
+    // Swap the staging tables into place
+    await runTransaction(db, (track) => {
+        tables.forEach((table) => {
+            db.run(`ALTER TABLE ${table} RENAME TO ${retired(table)}`, [], track);
+            db.run(`ALTER TABLE ${staging(table)} RENAME TO ${table}`, [], track);
+        });
+        recordWatermark(db, watermark, track);
+    });
+
+    // Dropping the old tables is cleanup; a failure here is retried by the next full sync
+    try {
+        await Promise.all(tables.map((table) => runStatement(db, `DROP TABLE IF EXISTS ${retired(table)}`)));
+    } catch (error) {
+        log('warn', 'Error dropping retired product tables:', error);
+    }
+
+    log('info', `Successfully inserted ${inserted} products`);
+    return {
+        mode: SYNC_MODES.FULL, inserted, updated: 0, deleted: 0,
+    };
+}
+
+function hasStoredRows(db) {
+    return new Promise((resolve, reject) => {
+        db.get('SELECT EXISTS (SELECT 1 FROM products) AS populated', [], (err, row) => (
+            err ? reject(err) : resolve(Boolean(row.populated))
+        ));
+    });
+}
+
+function loadStoredRows(db, itemCodes, columns = PRODUCT_COLUMNS) {
+    return timed(sqliteQueryDuration, { operation: 'sync_load_rows' }, new Promise((resolve, reject) => {
+        db.all(
+            `SELECT ${columns.join(', ')} FROM products
+             WHERE item_code IN (${itemCodes.map(() => '?').join(', ')})`,
+            itemCodes,
+            (err, rows) => {
+                if (err) {
+                    reject(err);
+                    return;
+                }
+                resolve(new Map(rows.map((row) => [row.item_code, row])));
+            },
+        );
+    }));
+}
+
+function loadStoredItemCodes(db) {
+    return new Promise((resolve, reject) => {
+        db.all('SELECT item_code FROM products', [], (err, rows) => (
+            err ? reject(err) : resolve(rows.map((row) => row.item_code))
+        ));
+    });
+}
+
+// Diff the feed against stored rows and write only what changed, so the cost
+// of a refresh follows the number of changes rather than the catalog size.
+// Rows are compared column by column because stock changes do not always move
+// RecordModified. The feed is consumed batch by batch; only item codes are
+// kept for the whole run, to find products that vanished from it.
+async function storeIncremental(db, products, log) {
+    if (!(await hasStoredRows(db))) {
+        return storeFull(db, products, log);
+    }
+
+    const seen = new Set();
+    let inserted = 0;
+    let updated = 0;
+    let watermark = null;
+
+    // Plain db.run calls keep the per-product statements in order under
+    // serialize, unlike interleaving several prepared statements
+    const deleteDerived = (params, track) => DERIVED_TABLES
+        .forEach((table) => db.run(table.deleteRowSql(), params, track));
+    const insertDerived = (params, track) => DERIVED_TABLES
+        .forEach((table) => db.run(table.insertRowSql(), params, track));
+
+    for await (const batch of inBatches(products, BATCH_SIZE)) {
+        const incoming = new Map(toRows(batch, log).map((row) => [row[ITEM_CODE], row]));
+        if (incoming.size) {
+            const stored = await loadStoredRows(db, [...incoming.keys()]);
+            const changed = [];
+            incoming.forEach((row, itemCode) => {
+                const current = stored.get(itemCode);
+                if (!current) {
+                    if (!seen.has(itemCode)) inserted += 1;
+                    changed.push(row);
+                } else if (PRODUCT_COLUMNS.some((column, i) => !sameValue(current[column], row[i]))) {
+                    updated += 1;
+                    changed.push(row);
+                }
+                seen.add(itemCode);
+            });
+            watermark = maxRecordModified([...incoming.values()], watermark);
+
+            if (changed.length) {
+                await runTransaction(db, (track) => {
+                    changed.forEach((row) => {
+                        const params = { $item_code: row[ITEM_CODE] };
+                        deleteDerived(params, track);
+                        db.run(UPSERT_SQL, row, track);
+                        insertDerived(params, track);
+                    });
+                });
+            }
+        }
+    }
+
+    if (!seen.size) {
+        throw new Error('Product feed is empty, refusing to delete the stored catalog');
+    }
+
+    const removed = (await loadStoredItemCodes(db)).filter((itemCode) => !seen.has(itemCode));
+    await runTransaction(db, (track) => {
+        removed.forEach((itemCode) => {
+            deleteDerived({ $item_code: itemCode }, track);
+            db.run('DELETE FROM products WHERE item_code = ?', [itemCode], track);
+        });
+        recordWatermark(db, watermark, track);
+    });
+
+    log('info', `Incremental sync: ${inserted} inserted, ${updated} updated, ${removed.length} deleted`);
+    return {
+        mode: SYNC_MODES.INCREMENTAL, inserted, updated, deleted: removed.length,
+    };
+}
+
+// Update only warehouse_data and warehouse_stock from a feed of records with
+// ItemCode and Warehouses; every other column, and the search indexes, stay
+// as they are. Products the catalog does not have yet are left for the next
+// catalog sync. Returns the changed products as { id, warehouse_data } so
+// callers can patch what they hold in memory.
+async function storeStock(db, products, log) {
+    const changes = [];
+    let unknown = 0;
+
+    for await (const batch of inBatches(products, BATCH_SIZE)) {
+        const incoming = new Map();
+        batch.forEach((product) => {
+            if (product?.ItemCode) incoming.set(product.ItemCode, warehouseData(product));
+        });
+        if (incoming.size) {
+            const stored = await loadStoredRows(db, [...incoming.keys()], ['id', 'item_code', 'warehouse_data']);
+            const changed = [];
+            incoming.forEach((data, itemCode) => {
+                const current = stored.get(itemCode);
+                if (!current) {
+                    unknown += 1;
+                } else if (!sameValue(current.warehouse_data, data)) {
+                    changed.push({ itemCode, id: current.id, data });
+                }
+            });
+
+            if (changed.length) {
+                await runTransaction(db, (track) => {
+                    changed.forEach(({ itemCode, data }) => {
+                        const params = { $item_code: itemCode };
+                        db.run(stock.deleteRowSql(), params, track);
+                        db.run('UPDATE products SET warehouse_data = ? WHERE item_code = ?', [data, itemCode], track);
+                        db.run(stock.insertRowSql(), params, track);
+                    });
+                });
+                changed.forEach(({ id, data }) => changes.push({ id, warehouse_data: data }));
+            }
+        }
+    }
+
+    log('info', `Stock sync: ${changes.length} products changed, ${unknown} not in the catalog yet`);
+    return {
+        mode: SYNC_MODES.STOCK, inserted: 0, updated: changes.length, deleted: 0, changes,
+    };
+}
+
+module.exports = {
+    PRODUCTS_TABLE,
+    DERIVED_TABLES,
+    SYNC_MODES,
+    PRODUCT_COLUMNS,
+    createTableSql,
+    createIndexesSql,
+    ensureIndexes,
+    toRow,
+    maxRecordModified,
+    runTransaction,
+    storeFull,
+    storeIncremental,
+    storeStock,
+};
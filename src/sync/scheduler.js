@@ -0,0 +1,106 @@
+// Runs syncs one at a time: on jittered intervals per mode, and on demand.
+// A request for work that a running or queued sync already covers joins that
+// sync instead of starting another, so repeated manual refreshes and timer
+// ticks that land mid-sync cost nothing extra.
+
+const { SYNC_MODES } = require('./products');
+
+// A full sync rewrites everything an incremental one would, and both rewrite stock
+const COVERS = {
+    [SYNC_MODES.FULL]: [SYNC_MODES.FULL, SYNC_MODES.INCREMENTAL, SYNC_MODES.STOCK],
+    [SYNC_MODES.INCREMENTAL]: [SYNC_MODES.INCREMENTAL, SYNC_MODES.STOCK],
+    [SYNC_MODES.STOCK]: [SYNC_MODES.STOCK],
+};
+
+const DEFAULT_JITTER = 0.1; // +/- fraction of each interval
+
+function covers(running, requested) {
+    return (COVERS[running] || [running]).includes(requested);
+}
+
+// intervalMs spread by +/- jitter, so restarts and several instances don't
+// hit the DK API in lockstep
+function jittered(intervalMs, jitter = DEFAULT_JITTER, random = Math.random) {
+    const spread = Math.min(Math.max(jitter, 0), 1);
+    return Math.max(0, Math.round(intervalMs * (1 + (random() * 2 - 1) * spread)));
+}
+
+// run(mode) performs one sync and resolves with its result. intervals maps
+// mode -> ms between scheduled runs (0 or missing: on demand only).
+function createSyncScheduler({
+    run,
+    intervals = {},
+    jitter = DEFAULT_JITTER,
+    log = () => {},
+}) {
+    let current = null; // { mode, promise }
+    const queue = []; // [{ mode, promise }], run in order after current
+    const timers = new Map();
+    let stopped = false;
+
+    function execute(entry) {
+        current = entry;
+        return run(entry.mode).finally(() => {
+            current = null;
+        });
+    }
+
+    // Resolves with the result of the sync that covers `mode`
+    function request(mode) {
+        if (current && covers(current.mode, mode)) return current.promise;
+        const queued = queue.find((entry) => covers(entry.mode, mode));
+        if (queued) return queued.promise;
+
+        const entry = { mode };
+        const previous = queue.length ? queue[queue.length - 1].promise : current?.promise;
+        entry.promise = (previous || Promise.resolve())
+            .catch(() => {}) // The previous sync's failure is its caller's concern
+            .then(() => {
+                queue.splice(queue.indexOf(entry), 1);
+                return execute(entry);
+            });
+        queue.push(entry);
+        return entry.promise;
+    }
+
+    function schedule(mode) {
+        const intervalMs = intervals[mode];
+        if (!intervalMs || stopped) return;
+        const timer = setTimeout(() => {
+            request(mode)
+                .catch((error) => log('error', `Scheduled ${mode} sync failed:`, error))
+                .finally(() => schedule(mode));
+        }, jittered(intervalMs, jitter));
+        timer.unref();
+        timers.set(mode, timer);
+    }
+
+    return {
+        request,
+
+        start() {
+            stopped = false;
+            Object.entries(intervals).forEach(([mode, intervalMs]) => {
+                if (!intervalMs) return;
+                schedule(mode);
+                log('info', `Scheduled ${mode} sync every ${Math.round(intervalMs / 1000)}s (+/-${Math.round(jitter * 100)}%)`);
+            });
+        },
+
+        stop() {
+            stopped = true;
+            timers.forEach((timer) => clearTimeout(timer));
+            timers.clear();
+        },
+
+        // Mode of the sync in progress, or null
+        running: () => (current ? current.mode : null),
+        queued: () => queue.map((entry) => entry.mode),
+    };
+}
+
+module.exports = {
+    covers,
+    jittered,
+    createSyncScheduler,
+};
@@ -0,0 +1,68 @@
+// Small key/value table for sync bookkeeping (watermarks, timestamps).
+
+const STATE_TABLE = 'sync_state';
+
+const KEYS = {
+    MAX_RECORD_MODIFIED: 'max_record_modified',
+    LAST_SYNC: 'last_sync', // Suffixed with the sync mode, see lastSyncKey()
+};
+
+// Key holding the ISO time of the last successful sync in `mode`
+function lastSyncKey(mode) {
+    return `${KEYS.LAST_SYNC}:${mode}`;
+}
+
+function createTableSql() {
+    return `
+        CREATE TABLE IF NOT EXISTS ${STATE_TABLE} (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    `;
+}
+
+function setSql() {
+    return `
+        INSERT INTO ${STATE_TABLE} (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+    `;
+}
+
+function get(db, key) {
+    return new Promise((resolve, reject) => {
+        db.get(
+            `SELECT value FROM ${STATE_TABLE} WHERE key = ?`,
+            [key],
+            (err, row) => (err ? reject(err) : resolve(row ? row.value : null)),
+        );
+    });
+}
+
+function set(db, key, value) {
+    return new Promise((resolve, reject) => {
+        db.run(setSql(), [key, value], (err) => (err ? reject(err) : resolve()));
+    });
+}
+
+// ISO time of the last successful sync in any mode, or null
+function lastSync(db) {
+    return new Promise((resolve, reject) => {
+        db.get(
+            `SELECT MAX(value) AS value FROM ${STATE_TABLE} WHERE key LIKE ?`,
+            [`${KEYS.LAST_SYNC}:%`],
+            (err, row) => (err ? reject(err) : resolve(row ? row.value : null)),
+        );
+    });
+}
+
+module.exports = {
+    STATE_TABLE,
+    KEYS,
+    lastSyncKey,
+    createTableSql,
+    setSql,
+    get,
+    set,
+    lastSync,
+};
@@ -0,0 +1,83 @@
+const { StringDecoder } = require('string_decoder');
+
+const WHITESPACE = /\s/;
+
+// Parse a stream holding one top-level JSON array and yield its elements one
+// by one, so only the element being read is held in memory.
+async function* parseJsonArray(source) {
+    const decoder = new StringDecoder('utf8');
+    let started = false;
+    let ended = false;
+    let depth = 0;
+    let inString = false;
+    let escaped = false;
+    let element = '';
+
+    const parseElement = (text) => {
+        const trimmed = text.trim();
+        if (!trimmed) throw new Error('Empty element in JSON array');
+        return JSON.parse(trimmed);
+    };
+
+    for await (const chunk of source) {
+        const text = typeof chunk === 'string' ? chunk : decoder.write(chunk);
+        let start = 0;
+
+        for (let i = 0; i < text.length; i += 1) {
+            const ch = text[i];
+
+            if (!started || ended) {
+                if (!started && ch === '[') {
+                    started = true;
+                    start = i + 1;
+                } else if (!WHITESPACE.test(ch)) {
+                    throw new Error(`Expected a JSON array, found '${ch}'`);
+                }
+            } else if (inString) {
+                if (escaped) escaped = false;
+                else if (ch === '\\') escaped = true;
+                else if (ch === '"') inString = false;
+            } else if (ch === '"') {
+                inString = true;
+            } else if (ch === '{' || ch === '[') {
+                depth += 1;
+            } else if (ch === '}' || ch === ']') {
+                if (depth === 0) {
+                    element += text.slice(start, i);
+                    if (element.trim()) yield parseElement(element);
+                    element = '';
+                    ended = true;
+                } else {
+                    depth -= 1;
+                }
+            } else if (ch === ',' && depth === 0) {
+                element += text.slice(start, i);
+                yield parseElement(element);
+                element = '';
+                start = i + 1;
+            }
+        }
+
+        if (started && !ended) element += text.slice(start);
+    }
+
+    if (!ended) throw new Error('Unexpected end of JSON array');
+}
+
+// Group an (async) iterable into arrays of at most `size` items
+async function* inBatches(iterable, size) {
+    let batch = [];
+    for await (const item of iterable) {
+        batch.push(item);
+        if (batch.length >= size) {
+            yield batch;
+            batch = [];
+        }
+    }
+    if (batch.length) yield batch;
+}
+
+module.exports = {
+    parseJsonArray,
+    inBatches,
+};
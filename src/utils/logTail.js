@@ -0,0 +1,88 @@
+const fs = require('fs');
+const { LEVELS } = require('./logger');
+
+const CHUNK_SIZE = 64 * 1024;
+const NEWLINE = 0x0a;
+
+// Yield a file's lines last to first, reading fixed-size chunks backwards
+// from the end so only the tail that is actually consumed gets read.
+async function* readLinesBackwards(file, chunkSize = CHUNK_SIZE) {
+    let handle;
+    try {
+        handle = await fs.promises.open(file, 'r');
+    } catch (error) {
+        if (error.code === 'ENOENT') return;
+        throw error;
+    }
+
+    try {
+        let position = (await handle.stat()).size;
+        let leftover = Buffer.alloc(0);
+
+        while (position > 0) {
+            const length = Math.min(chunkSize, position);
+            position -= length;
+            const chunk = Buffer.alloc(length);
+            await handle.read(chunk, 0, length, position);
+
+            // Split on bytes: '\n' never occurs inside a multi-byte UTF-8 character
+            const buffer = Buffer.concat([chunk, leftover]);
+            let end = buffer.length;
+            let newline = end > 0 ? buffer.lastIndexOf(NEWLINE, end - 1) : -1;
+            while (newline !== -1) {
+                if (newline + 1 < end) yield buffer.toString('utf8', newline + 1, end);
+                end = newline;
+                newline = end > 0 ? buffer.lastIndexOf(NEWLINE, end - 1) : -1;
+            }
+            leftover = buffer.subarray(0, end);
+        }
+
+        if (leftover.length) yield leftover.toString('utf8');
+    } finally {
+        await handle.close();
+    }
+}
+
+// Most recent log entries first, across the live file and its rotated
+// predecessors. Stops reading as soon as `limit` entries match or an entry
+// older than `since` is reached, so cost follows the entries returned rather
+// than the size of the log.
+//   level: most verbose level to include ('warn' returns errors and warnings)
+//   since / until: epoch ms bounds on the entry timestamp
+async function readRecentLogs(files, {
+    limit = 1000,
+    level,
+    since,
+    until,
+    chunkSize = CHUNK_SIZE,
+} = {}) {
+    const maxLevel = level ? LEVELS[level] ?? LEVELS.debug : LEVELS.debug;
+    const entries = [];
+    if (limit <= 0) return entries;
+
+    for (const file of files) {
+        for await (const line of readLinesBackwards(file, chunkSize)) {
+            let entry;
+            try {
+                entry = JSON.parse(line);
+            } catch {
+                continue; // Partially written or foreign line
+            }
+
+            const time = Date.parse(entry.timestamp);
+            if (until !== undefined && time > until) continue;
+            if (since !== undefined && time < since) return entries;
+            if ((LEVELS[entry.level] ?? LEVELS.error) > maxLevel) continue;
+
+            entries.push(entry);
+            if (entries.length >= limit) return entries;
+        }
+    }
+
+    return entries;
+}
+
+module.exports = {
+    readLinesBackwards,
+    readRecentLogs,
+};
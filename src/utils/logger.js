@@ -1 +1,219 @@
- 
\ No newline at end of file
+const fs = require('fs');
+const path = require('path');
+
+const LEVELS = {
+    error: 0,
+    warn: 1,
+    info: 2,
+    debug: 3,
+};
+
+const DEFAULTS = {
+    level: 'info',
+    flushIntervalMs: 1000, // Write queued lines at least this often
+    flushBatchSize: 256, // ...or as soon as this many are queued
+    maxQueueSize: 10000, // Info/debug lines beyond this are dropped (and counted)...
+    urgentQueueReserve: 1000, // ...errors and warnings only beyond this many more
+    maxBytes: 10 * 1024 * 1024, // Rotate once the live file reaches this size...
+    rotateIntervalMs: 24 * 60 * 60 * 1000, // ...or is this old (0 disables time-based rotation)
+    maxFiles: 5, // Rotated files kept as app.log.1 (newest) .. app.log.N
+};
+
+// The live file followed by its rotated predecessors, newest first
+function logFiles(file, maxFiles = DEFAULTS.maxFiles) {
+    const files = [file];
+    for (let i = 1; i <= maxFiles; i += 1) files.push(`${file}.${i}`);
+    return files;
+}
+
+async function renameIfExists(from, to) {
+    try {
+        await fs.promises.rename(from, to);
+    } catch (error) {
+        if (error.code !== 'ENOENT') throw error;
+    }
+}
+
+// JSON-lines logger that never blocks the event loop. log() only formats and
+// queues a line; queued lines go out through one append stream in batches,
+// on a timer, when the batch fills up, and on close(). The file is rotated
+// by size or age between batches, while new lines keep queueing.
+function createLogger(options) {
+    const {
+        file,
+        level,
+        flushIntervalMs,
+        flushBatchSize,
+        maxQueueSize,
+        urgentQueueReserve,
+        maxBytes,
+        rotateIntervalMs,
+        maxFiles,
+        console: logToConsole = false,
+    } = { ...DEFAULTS, ...options };
+
+    const threshold = LEVELS[level] ?? LEVELS[DEFAULTS.level];
+
+    if (!fs.existsSync(path.dirname(file))) {
+        fs.mkdirSync(path.dirname(file), { recursive: true });
+    }
+
+    let stream = null;
+    let size = 0;
+    let openedAt = Date.now();
+    let queue = [];
+    let dropped = 0;
+    let droppedUrgent = 0; // Errors and warnings among the dropped lines
+    let draining = false;
+    let rotation = null;
+    let closed = false;
+
+    function open() {
+        try {
+            const stat = fs.statSync(file);
+            size = stat.size;
+            // Age an existing file from its creation so restarts don't postpone rotation
+            openedAt = stat.birthtimeMs || stat.mtimeMs;
+        } catch {
+            size = 0;
+            openedAt = Date.now();
+        }
+        stream = fs.createWriteStream(file, { flags: 'a' });
+        stream.on('error', (error) => {
+            // Nowhere left to log to; report once on stderr
+            console.error('Log stream error:', error);
+        });
+    }
+
+    function needsRotation() {
+        if (maxBytes && size >= maxBytes) return true;
+        return Boolean(rotateIntervalMs && size > 0 && Date.now() - openedAt >= rotateIntervalMs);
+    }
+
+    // Close the live file, shift app.log.N-1 -> app.log.N ... app.log -> app.log.1,
+    // and reopen. Lines logged meanwhile wait in the queue.
+    function rotate() {
+        const closing = stream;
+        stream = null;
+        rotation = new Promise((resolve) => closing.end(resolve))
+            .then(async () => {
+                const files = logFiles(file, maxFiles);
+                for (let i = files.length - 1; i > 0; i -= 1) {
+                    await renameIfExists(files[i - 1], files[i]);
+                }
+            })
+            .catch((error) => console.error('Log rotation failed:', error))
+            .then(() => {
+                rotation = null;
+                if (closed) return;
+                open();
+                flush();
+            });
+    }
+
+    function format(entryLevel, message, error = null) {
+        const logEntry = {
+            timestamp: new Date().toISOString(),
+            level: entryLevel,
+            message,
+            ...(error && { error: error.stack || error.message || error }),
+        };
+        return `${JSON.stringify(logEntry)}\n`;
+    }
+
+    function takeQueued() {
+        if (dropped) {
+            const urgent = droppedUrgent ? ` (${droppedUrgent} errors or warnings)` : '';
+            queue.push(format('warn', `Logger queue full, dropped ${dropped} log lines${urgent}`));
+            dropped = 0;
+            droppedUrgent = 0;
+        }
+        const chunk = queue.join('');
+        queue = [];
+        return chunk;
+    }
+
+    function write(chunk) {
+        size += Buffer.byteLength(chunk);
+        return stream.write(chunk);
+    }
+
+    function flush() {
+        if (!stream || draining || (!queue.length && !dropped)) return;
+        if (needsRotation()) {
+            rotate();
+            return;
+        }
+        if (!write(takeQueued())) {
+            draining = true;
+            stream.once('drain', () => {
+                draining = false;
+                flush();
+            });
+        }
+    }
+
+    open();
+
+    const timer = setInterval(flush, flushIntervalMs);
+    timer.unref();
+
+    function log(entryLevel, message, error = null) {
+        if ((LEVELS[entryLevel] ?? LEVELS.error) > threshold) return;
+
+        // Errors and warnings get headroom past the bound, but the queue never
+        // grows without limit while the stream is stuck
+        const urgent = (LEVELS[entryLevel] ?? LEVELS.error) <= LEVELS.warn;
+        if (queue.length >= maxQueueSize + (urgent ? urgentQueueReserve : 0)) {
+            dropped += 1;
+            if (urgent) droppedUrgent += 1;
+        } else {
+            queue.push(format(entryLevel, message, error));
+            if (queue.length >= flushBatchSize) flush();
+        }
+
+        if (logToConsole) {
+            console[entryLevel](message, error || '');
+        }
+    }
+
+    // Flush everything and close the stream
+    async function close() {
+        clearInterval(timer);
+        closed = true;
+        if (rotation) {
+            await rotation;
+            open();
+        }
+        await new Promise((resolve) => {
+            if (!stream) {
+                resolve();
+                return;
+            }
+            const closing = stream;
+            stream = null;
+            if (queue.length || dropped) closing.write(takeQueued());
+            closing.end(resolve);
+        });
+    }
+
+    // Last resort for process exit, when async writes can no longer complete
+    function flushSync() {
+        if (!queue.length && !dropped) return;
+        fs.appendFileSync(file, takeQueued());
+    }
+
+    return {
+        log,
+        flush,
+        close,
+        flushSync,
+        files: () => logFiles(file, maxFiles),
+    };
+}
+
+module.exports = {
+    LEVELS,
+    createLogger,
+    logFiles,
+};
@@ -0,0 +1,17 @@
+const barcodes = require('../src/search/barcodes');
+
+describe('Barcode lookup', () => {
+    describe('isBarcode', () => {
+        it('should accept digit-only scanner input', () => {
+            expect(barcodes.isBarcode('5690123456789')).toBe(true);
+            expect(barcodes.isBarcode(' 0987654321 ')).toBe(true);
+        });
+
+        it('should reject anything else', () => {
+            expect(barcodes.isBarcode('TEST001')).toBe(false);
+            expect(barcodes.isBarcode('123 456')).toBe(false);
+            expect(barcodes.isBarcode('')).toBe(false);
+            expect(barcodes.isBarcode(undefined)).toBe(false);
+        });
+    });
+});
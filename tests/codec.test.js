@@ -0,0 +1,53 @@
+const zlib = require('zlib');
+const { CODECS, createCodec } = require('../src/cache/codec');
+
+describe('Cache codec', () => {
+    const large = Buffer.from(JSON.stringify(Array(200).fill({ item_code: 'TEST001', name: 'Blue Test Shirt' })));
+    const small = Buffer.from('[]');
+
+    Object.keys(CODECS).forEach((name) => {
+        it(`should round-trip values with ${name}`, async () => {
+            const codec = createCodec({ name });
+            expect((await codec.decode(await codec.encode(large))).equals(large)).toBe(true);
+            expect((await codec.decode(await codec.encode(small))).equals(small)).toBe(true);
+        });
+    });
+
+    it('should only compress above the threshold', async () => {
+        const codec = createCodec({ name: 'gzip', minSize: 1024 });
+        expect((await codec.encode(small))[0]).toBe(CODECS.identity.id);
+        const encoded = await codec.encode(large);
+        expect(encoded[0]).toBe(CODECS.gzip.id);
+        expect(encoded.length).toBeLessThan(large.length);
+    });
+
+    it('should decode values written by another codec', async () => {
+        const encoded = await createCodec({ name: 'brotli' }).encode(large);
+        expect((await createCodec({ name: 'gzip' }).decode(encoded)).equals(large)).toBe(true);
+    });
+
+    it('should read legacy string values', async () => {
+        const codec = createCodec();
+        const legacyGzip = Buffer.from(`z:${zlib.gzipSync(large).toString('base64')}`);
+        expect((await codec.decode(legacyGzip)).equals(large)).toBe(true);
+        expect((await codec.decode(Buffer.from('j:[]'))).toString()).toBe('[]');
+        expect((await codec.decode(Buffer.from('[]'))).toString()).toBe('[]');
+    });
+
+    it('should carry a fresh-until stamp when given one', async () => {
+        const codec = createCodec({ name: 'deflate-raw' });
+        const freshUntil = Date.now() + 300000;
+
+        const stamped = await codec.decodeEntry(await codec.encode(large, { freshUntil }));
+        expect(stamped.buffer.equals(large)).toBe(true);
+        expect(Math.abs(stamped.freshUntil - freshUntil)).toBeLessThan(1000);
+        expect(stamped.compressed).toBe(true);
+
+        const unstamped = await codec.decodeEntry(await codec.encode(small));
+        expect(unstamped).toEqual({ buffer: small, freshUntil: null, compressed: false });
+    });
+
+    it('should reject unknown codecs', () => {
+        expect(() => createCodec({ name: 'lz4' })).toThrow();
+    });
+});
@@ -0,0 +1,22 @@
+const fts = require('../src/search/fts');
+
+describe('Full-text search', () => {
+    describe('buildMatchExpression', () => {
+        it('should prefix-match every term', () => {
+            expect(fts.buildMatchExpression('blue shi')).toBe('"blue"* AND "shi"*');
+        });
+
+        it('should escape double quotes', () => {
+            expect(fts.buildMatchExpression('12" pipe')).toBe('"12"""* AND "pipe"*');
+        });
+
+        it('should skip terms without letters or digits', () => {
+            expect(fts.buildMatchExpression('  - shirt  ')).toBe('"shirt"*');
+        });
+
+        it('should return null when nothing is indexable', () => {
+            expect(fts.buildMatchExpression('- / ')).toBeNull();
+            expect(fts.buildMatchExpression(undefined)).toBeNull();
+        });
+    });
+});
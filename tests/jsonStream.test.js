@@ -0,0 +1,46 @@
+const { parseJsonArray, inBatches } = require('../src/utils/jsonStream');
+
+const collect = async (iterable) => {
+    const items = [];
+    for await (const item of iterable) items.push(item);
+    return items;
+};
+
+const chunked = (text, size) => {
+    const buffer = Buffer.from(text);
+    const chunks = [];
+    for (let i = 0; i < buffer.length; i += size) chunks.push(buffer.subarray(i, i + size));
+    return chunks;
+};
+
+describe('JSON streaming', () => {
+    const products = [
+        { ItemCode: 'TEST001', Description: 'Húfa, "blá" [stór]', Barcodes: [{ Barcode: '1234567890' }] },
+        { ItemCode: 'TEST002', Warehouses: [] },
+        { ItemCode: 'TEST003' },
+    ];
+
+    describe('parseJsonArray', () => {
+        it('should yield every element regardless of chunk boundaries', async () => {
+            const text = ` ${JSON.stringify(products)}\n`;
+            for (const size of [1, 3, 7, 1024]) {
+                expect(await collect(parseJsonArray(chunked(text, size)))).toEqual(products);
+            }
+        });
+
+        it('should handle an empty array', async () => {
+            expect(await collect(parseJsonArray(['[ ]']))).toEqual([]);
+        });
+
+        it('should reject anything but a complete array', async () => {
+            await expect(collect(parseJsonArray(['{"error":"Unauthorized"}']))).rejects.toThrow();
+            await expect(collect(parseJsonArray(['[{"ItemCode":"A"},']))).rejects.toThrow();
+        });
+    });
+
+    describe('inBatches', () => {
+        it('should group items into bounded batches', async () => {
+            expect(await collect(inBatches([1, 2, 3, 4, 5], 2))).toEqual([[1, 2], [3, 4], [5]]);
+        });
+    });
+});
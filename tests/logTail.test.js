@@ -0,0 +1,57 @@
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { readLinesBackwards, readRecentLogs } = require('../src/utils/logTail');
+
+describe('Log tail', () => {
+    let dir;
+    let file;
+
+    const entry = (minute, level, message) => JSON.stringify({
+        timestamp: `2024-01-01T10:${String(minute).padStart(2, '0')}:00.000Z`,
+        level,
+        message,
+    });
+
+    beforeEach(() => {
+        dir = fs.mkdtempSync(path.join(os.tmpdir(), 'ss-logtail-'));
+        file = path.join(dir, 'app.log');
+    });
+
+    afterEach(() => {
+        fs.rmSync(dir, { recursive: true, force: true });
+    });
+
+    it('should read lines backwards across chunk boundaries', async () => {
+        fs.writeFileSync(file, 'first\nsecond þráður\n\nthird\n');
+        const lines = [];
+        for await (const line of readLinesBackwards(file, 4)) lines.push(line);
+
+        expect(lines).toEqual(['third', 'second þráður', 'first']);
+    });
+
+    it('should return the most recent entries first, continuing into rotated files', async () => {
+        fs.writeFileSync(`${file}.1`, `${entry(1, 'info', 'a')}\n${entry(2, 'info', 'b')}\n`);
+        fs.writeFileSync(file, `${entry(3, 'info', 'c')}\n{"partial\n`);
+
+        const logs = await readRecentLogs([file, `${file}.1`, `${file}.2`], { limit: 2 });
+        expect(logs.map((log) => log.message)).toEqual(['c', 'b']);
+    });
+
+    it('should filter by level and time range', async () => {
+        fs.writeFileSync(file, [
+            entry(1, 'error', 'a'),
+            entry(2, 'warn', 'b'),
+            entry(3, 'info', 'c'),
+            entry(4, 'error', 'd'),
+            entry(5, 'error', 'e'),
+        ].join('\n'));
+
+        const logs = await readRecentLogs([file], {
+            level: 'warn',
+            since: Date.parse('2024-01-01T10:02:00.000Z'),
+            until: Date.parse('2024-01-01T10:04:00.000Z'),
+        });
+        expect(logs.map((log) => log.message)).toEqual(['d', 'b']);
+    });
+});
@@ -0,0 +1,85 @@
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { createLogger } = require('../src/utils/logger');
+
+describe('Logger', () => {
+    let dir;
+    let file;
+
+    const readEntries = () => fs.readFileSync(file, 'utf8')
+        .split('\n')
+        .filter(Boolean)
+        .map((line) => JSON.parse(line));
+
+    beforeEach(() => {
+        dir = fs.mkdtempSync(path.join(os.tmpdir(), 'ss-logger-'));
+        file = path.join(dir, 'app.log');
+    });
+
+    afterEach(() => {
+        fs.rmSync(dir, { recursive: true, force: true });
+    });
+
+    it('should write queued entries on close', async () => {
+        const logger = createLogger({ file, level: 'info' });
+        logger.log('info', 'Server started');
+        logger.log('error', 'Database error', new Error('SQLITE_BUSY'));
+        await logger.close();
+
+        const entries = readEntries();
+        expect(entries.map((entry) => entry.message)).toEqual(['Server started', 'Database error']);
+        expect(entries[1].error).toMatch(/SQLITE_BUSY/);
+    });
+
+    it('should honour the configured level', async () => {
+        const logger = createLogger({ file, level: 'warn' });
+        logger.log('debug', 'Cache set');
+        logger.log('info', 'Cache hit');
+        logger.log('warn', 'Redis reconnecting');
+        await logger.close();
+
+        expect(readEntries().map((entry) => entry.level)).toEqual(['warn']);
+    });
+
+    it('should drop low-priority entries past the queue bound but keep errors', async () => {
+        const logger = createLogger({
+            file, level: 'debug', maxQueueSize: 2, flushBatchSize: 100,
+        });
+        ['a', 'b', 'c', 'd'].forEach((message) => logger.log('info', message));
+        logger.log('error', 'kept');
+        await logger.close();
+
+        const messages = readEntries().map((entry) => entry.message);
+        expect(messages).toEqual(['a', 'b', 'kept', 'Logger queue full, dropped 2 log lines']);
+    });
+
+    it('should drop errors and warnings too once past the reserve', async () => {
+        const logger = createLogger({
+            file, level: 'debug', maxQueueSize: 2, urgentQueueReserve: 1, flushBatchSize: 100,
+        });
+        ['a', 'b', 'c'].forEach((message) => logger.log('info', message));
+        ['kept', 'lost'].forEach((message) => logger.log('error', message));
+        logger.log('warn', 'lost too');
+        await logger.close();
+
+        const messages = readEntries().map((entry) => entry.message);
+        expect(messages).toEqual([
+            'a', 'b', 'kept', 'Logger queue full, dropped 3 log lines (2 errors or warnings)',
+        ]);
+    });
+
+    it('should rotate the file once it reaches maxBytes', async () => {
+        fs.writeFileSync(file, `${JSON.stringify({ level: 'info', message: 'old' })}\n`);
+        const logger = createLogger({
+            file, level: 'info', maxBytes: 10, maxFiles: 2,
+        });
+        logger.log('info', 'new');
+        logger.flush();
+        await logger.close();
+
+        expect(readEntries().map((entry) => entry.message)).toEqual(['new']);
+        expect(fs.readFileSync(`${file}.1`, 'utf8')).toMatch(/"old"/);
+        expect(logger.files()).toEqual([file, `${file}.1`, `${file}.2`]);
+    });
+});
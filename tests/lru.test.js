@@ -0,0 +1,40 @@
+const { createLru } = require('../src/cache/lru');
+
+describe('LRU cache', () => {
+    it('should evict the least recently used entry past maxEntries', () => {
+        const lru = createLru({ maxEntries: 2, maxBytes: 1024 });
+        lru.set('a', Buffer.from('1'), 60);
+        lru.set('b', Buffer.from('2'), 60);
+        lru.get('a');
+        lru.set('c', Buffer.from('3'), 60);
+
+        expect(lru.get('a').toString()).toBe('1');
+        expect(lru.get('b')).toBeNull();
+        expect(lru.get('c').toString()).toBe('3');
+    });
+
+    it('should stay within maxBytes', () => {
+        const lru = createLru({ maxEntries: 10, maxBytes: 20 });
+        lru.set('a', Buffer.alloc(10), 60);
+        lru.set('b', Buffer.alloc(10), 60);
+
+        expect(lru.get('a')).toBeNull();
+        expect(lru.stats().bytes).toBeLessThanOrEqual(20);
+
+        lru.set('big', Buffer.alloc(64), 60);
+        expect(lru.get('big')).toBeNull();
+    });
+
+    it('should expire entries after their ttl', () => {
+        const lru = createLru({ maxEntries: 10, maxBytes: 1024 });
+        lru.set('a', Buffer.from('1'), 0);
+        expect(lru.get('a')).toBeNull();
+    });
+
+    it('should drop everything on clear', () => {
+        const lru = createLru({ maxEntries: 10, maxBytes: 1024 });
+        lru.set('a', Buffer.from('1'), 60);
+        lru.clear();
+        expect(lru.stats()).toMatchObject({ entries: 0, bytes: 0 });
+    });
+});
@@ -0,0 +1,77 @@
+const memoryIndex = require('../src/search/memoryIndex');
+
+const rows = [
+    { id: 1, item_code: 'TEST001', name: 'Test Product 1', barcodes: '["1234567890"]' },
+    { id: 2, item_code: 'TEST002', name: 'Blue Test Shirt', barcodes: '["0987654321"]' },
+    { id: 3, item_code: 'HUF-10', name: 'Húfa blá', barcodes: '[]' },
+];
+
+const fakeDb = {
+    all: (sql, params, callback) => callback(null, rows),
+};
+
+describe('In-memory search index', () => {
+    describe('after a build', () => {
+        beforeAll(() => memoryIndex.rebuild(fakeDb));
+
+        it('should be ready', () => {
+            expect(memoryIndex.isReady()).toBe(true);
+        });
+
+        it('should intersect posting lists for every term', () => {
+            const results = memoryIndex.search('shirt blue');
+            expect(results.map((row) => row.item_code)).toEqual(['TEST002']);
+        });
+
+        it('should match token prefixes', () => {
+            const results = memoryIndex.search('tes');
+            expect(results.map((row) => row.item_code)).toEqual(['TEST001', 'TEST002']);
+        });
+
+        it('should rank exact token matches first', () => {
+            const results = memoryIndex.search('test00');
+            expect(results).toHaveLength(2);
+            expect(memoryIndex.search('test002')[0]).toHaveProperty('item_code', 'TEST002');
+        });
+
+        it('should fold diacritics', () => {
+            expect(memoryIndex.search('HUFA bla')[0]).toHaveProperty('item_code', 'HUF-10');
+        });
+
+        it('should return an empty list when nothing matches', () => {
+            expect(memoryIndex.search('nothing')).toEqual([]);
+        });
+
+        it('should report index stats', () => {
+            expect(memoryIndex.stats()).toHaveProperty('rows', 3);
+        });
+
+        it('should patch stock on loaded rows without a rebuild', () => {
+            const warehouseData = '[{"Warehouse":"bg1","QuantityInStock":4}]';
+            expect(memoryIndex.updateRows([{ id: 2, warehouse_data: warehouseData }, { id: 99 }])).toBe(1);
+
+            const [shirt] = memoryIndex.search('shirt');
+            expect(shirt).toMatchObject({ item_code: 'TEST002', warehouse_data: warehouseData });
+        });
+    });
+
+    describe('column weights', () => {
+        const weightedRows = [
+            { id: 1, item_code: 'CASE-1', name: 'Phone case', extra_desc2: 'Fits the red shirt pocket' },
+            { id: 2, item_code: 'SHIRT-1', name: 'Red shirt' },
+        ];
+
+        beforeAll(() => memoryIndex.rebuild({
+            all: (sql, params, callback) => callback(null, weightedRows),
+        }));
+
+        it('should rank a name match above an earlier row matching in a low-weight column', () => {
+            const results = memoryIndex.search('red shirt');
+            expect(results.map((row) => row.item_code)).toEqual(['SHIRT-1', 'CASE-1']);
+        });
+
+        it('should weigh prefix matches by column too', () => {
+            expect(memoryIndex.search('shi').map((row) => row.item_code)).toEqual(['SHIRT-1', 'CASE-1']);
+        });
+    });
+});
@@ -0,0 +1,56 @@
+const { createRegistry } = require('../src/metrics/registry');
+
+describe('Metrics registry', () => {
+    it('should render counters per label set', () => {
+        const registry = createRegistry();
+        const requests = registry.counter({
+            name: 'cache_requests_total', help: 'Cache lookups', labelNames: ['tier', 'result'],
+        });
+        requests.inc({ tier: 'local', result: 'hit' });
+        requests.inc({ tier: 'local', result: 'hit' });
+        requests.inc({ tier: 'redis', result: 'miss' });
+
+        const output = registry.render();
+        expect(output).toContain('# TYPE cache_requests_total counter');
+        expect(output).toContain('cache_requests_total{tier="local",result="hit"} 2');
+        expect(output).toContain('cache_requests_total{tier="redis",result="miss"} 1');
+    });
+
+    it('should render cumulative histogram buckets', () => {
+        const registry = createRegistry();
+        const duration = registry.histogram({
+            name: 'query_seconds', help: 'Query time', labelNames: ['operation'], buckets: [0.01, 0.1],
+        });
+        duration.observe({ operation: 'search' }, 0.005);
+        duration.observe({ operation: 'search' }, 0.05);
+        duration.observe({ operation: 'search' }, 1);
+
+        const output = registry.render();
+        expect(output).toContain('query_seconds_bucket{operation="search",le="0.01"} 1');
+        expect(output).toContain('query_seconds_bucket{operation="search",le="0.1"} 2');
+        expect(output).toContain('query_seconds_bucket{operation="search",le="+Inf"} 3');
+        expect(output).toContain('query_seconds_sum{operation="search"} 1.055');
+        expect(output).toContain('query_seconds_count{operation="search"} 3');
+    });
+
+    it('should collect gauges at scrape time and escape label values', () => {
+        const registry = createRegistry();
+        let heapUsed = 10;
+        registry.gauge({
+            name: 'memory_bytes',
+            help: 'Memory',
+            labelNames: ['type'],
+            collect: (set) => set({ type: 'heap "used"' }, heapUsed),
+        });
+
+        expect(registry.render()).toContain('memory_bytes{type="heap \\"used\\""} 10');
+        heapUsed = 20;
+        expect(registry.render()).toContain('memory_bytes{type="heap \\"used\\""} 20');
+    });
+
+    it('should reject duplicate metric names', () => {
+        const registry = createRegistry();
+        registry.counter({ name: 'syncs_total', help: 'Syncs' });
+        expect(() => registry.counter({ name: 'syncs_total', help: 'Syncs' })).toThrow(/already registered/);
+    });
+});
@@ -0,0 +1,42 @@
+const { normalizeQuery, cacheIdentifier } = require('../src/search/normalize');
+
+describe('Query normalization', () => {
+    describe('normalizeQuery', () => {
+        it('should fold case, collapse whitespace and sort terms', () => {
+            expect(normalizeQuery('Blue Shirt')).toBe('blue shirt');
+            expect(normalizeQuery('  blue   shirt ')).toBe('blue shirt');
+            expect(normalizeQuery('shirt blue')).toBe('blue shirt');
+            expect(normalizeQuery('blue blue shirt')).toBe('blue shirt');
+        });
+
+        it('should keep Icelandic letters and compose accents', () => {
+            expect(normalizeQuery('ÞRÁÐUR Æði')).toBe('þráður æði');
+            expect(normalizeQuery('hár')).toBe('hár');
+        });
+
+        it('should fold full-width digits', () => {
+            expect(normalizeQuery('１２３４５')).toBe('12345');
+        });
+
+        it('should keep the order of queries without indexable terms', () => {
+            expect(normalizeQuery('/ -')).toBe('/ -');
+        });
+
+        it('should return an empty string for empty input', () => {
+            expect(normalizeQuery('   ')).toBe('');
+            expect(normalizeQuery(undefined)).toBe('');
+        });
+    });
+
+    describe('cacheIdentifier', () => {
+        it('should keep short queries readable', () => {
+            expect(cacheIdentifier('blue shirt')).toBe('blue shirt');
+        });
+
+        it('should hash long queries', () => {
+            const identifier = cacheIdentifier('x'.repeat(500));
+            expect(identifier).toMatch(/^h:[0-9a-f]{40}$/);
+            expect(cacheIdentifier('x'.repeat(500))).toBe(identifier);
+        });
+    });
+});
@@ -0,0 +1,37 @@
+const dbPragmas = require('../src/db/pragmas');
+
+describe('SQLite pragmas', () => {
+    it('should default to WAL with relaxed syncing', () => {
+        expect(dbPragmas.settingsFromEnv({})).toEqual(dbPragmas.DEFAULTS);
+        expect(dbPragmas.pragmaStatements(dbPragmas.DEFAULTS)).toEqual([
+            'PRAGMA busy_timeout = 5000',
+            'PRAGMA journal_mode = WAL',
+            'PRAGMA synchronous = NORMAL',
+            'PRAGMA mmap_size = 268435456',
+            'PRAGMA cache_size = -65536',
+            'PRAGMA temp_store = MEMORY',
+        ]);
+    });
+
+    it('should read overrides from the environment', () => {
+        const settings = dbPragmas.settingsFromEnv({
+            SQLITE_JOURNAL_MODE: 'delete',
+            SQLITE_SYNCHRONOUS: 'full',
+            SQLITE_MMAP_SIZE: '0',
+            SQLITE_BUSY_TIMEOUT: '',
+        });
+        expect(settings).toMatchObject({
+            journalMode: 'DELETE', synchronous: 'FULL', mmapSize: 0, busyTimeout: 5000,
+        });
+    });
+
+    it('should reject values that would be interpolated unchecked', () => {
+        expect(() => dbPragmas.settingsFromEnv({ SQLITE_JOURNAL_MODE: 'WAL; DROP TABLE products' })).toThrow();
+        expect(() => dbPragmas.settingsFromEnv({ SQLITE_CACHE_SIZE: '64MB' })).toThrow();
+    });
+
+    it('should report settings SQLite did not apply', () => {
+        const effective = { ...dbPragmas.DEFAULTS, journalMode: 'DELETE' };
+        expect(dbPragmas.mismatches(dbPragmas.DEFAULTS, effective)).toEqual(['journalMode']);
+    });
+});
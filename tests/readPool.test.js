@@ -0,0 +1,88 @@
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const sqlite3 = require('sqlite3');
+const { createReadPool, respawnDelay } = require('../src/db/readPool');
+
+describe('SQLite read pool', () => {
+    let dir;
+    let file;
+    let pool;
+
+    beforeAll(async () => {
+        dir = fs.mkdtempSync(path.join(os.tmpdir(), 'ss-readpool-'));
+        file = path.join(dir, 'test.sqlite');
+        const db = new sqlite3.Database(file);
+        await new Promise((resolve, reject) => {
+            db.serialize(() => {
+                db.run('PRAGMA journal_mode = WAL');
+                db.run('CREATE TABLE products (item_code TEXT, name TEXT)');
+                db.run("INSERT INTO products VALUES ('TEST001', 'Test Product 1'), ('TEST002', 'Blue Test Shirt')");
+                db.close((err) => (err ? reject(err) : resolve()));
+            });
+        });
+        pool = createReadPool({ file, size: 2, statements: ['PRAGMA busy_timeout = 1000'] });
+    });
+
+    afterAll(async () => {
+        await pool.close();
+        fs.rmSync(dir, { recursive: true, force: true });
+    });
+
+    it('should answer all() and get() like a sqlite3 database', async () => {
+        const rows = await new Promise((resolve, reject) => {
+            pool.all('SELECT item_code FROM products ORDER BY item_code', [], (err, result) => (
+                err ? reject(err) : resolve(result)
+            ));
+        });
+        expect(rows).toEqual([{ item_code: 'TEST001' }, { item_code: 'TEST002' }]);
+
+        const row = await new Promise((resolve, reject) => {
+            pool.get('SELECT name FROM products WHERE item_code = ?', ['TEST002'], (err, result) => (
+                err ? reject(err) : resolve(result)
+            ));
+        });
+        expect(row).toEqual({ name: 'Blue Test Shirt' });
+    });
+
+    it('should spread concurrent queries and pass errors back', async () => {
+        const counts = await Promise.all(Array.from({ length: 8 }, () => pool.query('get', 'SELECT COUNT(*) AS n FROM products')));
+        expect(counts.every((row) => row.n === 2)).toBe(true);
+        expect(pool.stats()).toMatchObject({ size: 2, inFlight: 0 });
+
+        await expect(pool.query('all', 'SELECT * FROM missing')).rejects.toThrow(/no such table/);
+    });
+
+    it('should refuse writes', async () => {
+        await expect(pool.query('all', "INSERT INTO products VALUES ('X', 'Y')")).rejects.toThrow(/readonly/);
+    });
+
+    describe('when workers die', () => {
+        let crashDir;
+        let crashing;
+
+        beforeAll(() => {
+            crashDir = fs.mkdtempSync(path.join(os.tmpdir(), 'ss-readpool-crash-'));
+            fs.writeFileSync(path.join(crashDir, 'crash.js'), 'process.exit(3);\n');
+        });
+
+        afterAll(async () => {
+            if (crashing) await crashing.close();
+            fs.rmSync(crashDir, { recursive: true, force: true });
+        });
+
+        it('should reject queries instead of sending them to a dead worker', async () => {
+            crashing = createReadPool({ file, size: 1, workerFile: path.join(crashDir, 'crash.js') });
+
+            await expect(crashing.query('all', 'SELECT 1')).rejects.toThrow(/exited with code 3/);
+            expect(crashing.available()).toBe(false);
+            await expect(crashing.query('all', 'SELECT 1')).rejects.toThrow(/No SQLite read worker/);
+            expect(crashing.stats()).toMatchObject({ live: 0, inFlight: 0 });
+        });
+
+        it('should back off between restarts of a worker that keeps dying', () => {
+            expect([1, 2, 3, 4].map(respawnDelay)).toEqual([1000, 2000, 4000, 8000]);
+            expect(respawnDelay(20)).toBe(60 * 1000);
+        });
+    });
+});
@@ -0,0 +1,76 @@
+const { covers, jittered, createSyncScheduler } = require('../src/sync/scheduler');
+
+// A run() whose syncs finish only when the test says so
+function controlledRun() {
+    const started = [];
+    const pending = [];
+    const run = (mode) => {
+        started.push(mode);
+        return new Promise((resolve, reject) => pending.push({ mode, resolve, reject }));
+    };
+    const finish = async (result) => {
+        pending.shift().resolve(result);
+        await new Promise((resolve) => setImmediate(resolve));
+    };
+    return { run, started, finish };
+}
+
+describe('Sync scheduler', () => {
+    it('should know which syncs cover which', () => {
+        expect(covers('full', 'incremental')).toBe(true);
+        expect(covers('incremental', 'stock')).toBe(true);
+        expect(covers('stock', 'incremental')).toBe(false);
+    });
+
+    it('should spread intervals by the jitter fraction', () => {
+        expect(jittered(1000, 0.1, () => 0)).toBe(900);
+        expect(jittered(1000, 0.1, () => 1)).toBe(1100);
+        expect(jittered(1000, 0, () => 0)).toBe(1000);
+    });
+
+    it('should join requests covered by the running sync', async () => {
+        const { run, started, finish } = controlledRun();
+        const scheduler = createSyncScheduler({ run });
+
+        const first = scheduler.request('full');
+        await new Promise((resolve) => setImmediate(resolve));
+        const second = scheduler.request('incremental');
+        expect(scheduler.running()).toBe('full');
+
+        await finish({ inserted: 1 });
+        await expect(first).resolves.toEqual({ inserted: 1 });
+        await expect(second).resolves.toEqual({ inserted: 1 });
+        expect(started).toEqual(['full']);
+    });
+
+    it('should run other modes one at a time and coalesce queued requests', async () => {
+        const { run, started, finish } = controlledRun();
+        const scheduler = createSyncScheduler({ run });
+
+        const stock = scheduler.request('stock');
+        await new Promise((resolve) => setImmediate(resolve));
+        const full = scheduler.request('full');
+        const again = scheduler.request('incremental');
+        expect(again).toBe(full);
+        expect(scheduler.queued()).toEqual(['full']);
+
+        await finish('stock done');
+        expect(started).toEqual(['stock', 'full']);
+        await finish('full done');
+
+        await expect(stock).resolves.toBe('stock done');
+        await expect(full).resolves.toBe('full done');
+        expect(scheduler.running()).toBeNull();
+    });
+
+    it('should start queued syncs after a failed one', async () => {
+        const scheduler = createSyncScheduler({
+            run: (mode) => (mode === 'stock' ? Promise.reject(new Error('DK API down')) : Promise.resolve(mode)),
+        });
+
+        const failed = scheduler.request('stock');
+        const next = scheduler.request('full');
+        await expect(failed).rejects.toThrow('DK API down');
+        await expect(next).resolves.toBe('full');
+    });
+});
@@ -0,0 +1,40 @@
+const { createSingleFlight } = require('../src/cache/singleFlight');
+
+describe('Single-flight', () => {
+    it('should share one execution between concurrent callers', async () => {
+        const flight = createSingleFlight();
+        let calls = 0;
+        const fn = () => new Promise((resolve) => {
+            calls += 1;
+            setTimeout(() => resolve(['row']), 10);
+        });
+
+        const results = await Promise.all([flight.run('a', fn), flight.run('a', fn), flight.run('a', fn)]);
+
+        expect(calls).toBe(1);
+        expect(results).toEqual([['row'], ['row'], ['row']]);
+        expect(flight.stats()).toEqual({ inFlight: 0, shared: 2 });
+    });
+
+    it('should run separately for different keys and later calls', async () => {
+        const flight = createSingleFlight();
+        let calls = 0;
+        const fn = async () => {
+            calls += 1;
+            return calls;
+        };
+
+        await Promise.all([flight.run('a', fn), flight.run('b', fn)]);
+        await flight.run('a', fn);
+
+        expect(calls).toBe(3);
+    });
+
+    it('should pass rejections to every caller and then forget the key', async () => {
+        const flight = createSingleFlight();
+        const failing = () => Promise.reject(new Error('Database error'));
+
+        await expect(Promise.all([flight.run('a', failing), flight.run('a', failing)])).rejects.toThrow('Database error');
+        await expect(flight.run('a', async () => 'ok')).resolves.toBe('ok');
+    });
+});
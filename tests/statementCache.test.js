@@ -0,0 +1,71 @@
+const { createStatementCache } = require('../src/db/statementCache');
+
+// Just enough of sqlite3's Database/Statement API to count prepares
+function fakeDb() {
+    const db = { prepared: [], finalized: [], resets: 0 };
+    db.prepare = (sql, callback) => {
+        const stmt = {
+            sql,
+            all: (params, cb) => cb(null, [{ sql, params }]),
+            get: (params, cb) => cb(null, { sql, params }),
+            reset: () => {
+                db.resets += 1;
+            },
+            finalize: () => db.finalized.push(sql),
+        };
+        db.prepared.push(sql);
+        process.nextTick(() => callback(sql.startsWith('BAD') ? new Error('syntax error') : null));
+        return stmt;
+    };
+    return db;
+}
+
+describe('Statement cache', () => {
+    it('should prepare each query shape once and count hits', async () => {
+        const db = fakeDb();
+        const lookups = [];
+        const cache = createStatementCache(db, { onLookup: (cached) => lookups.push(cached) });
+
+        await Promise.all([
+            cache.query('all', 'SELECT * FROM products WHERE name MATCH ?', ['a']),
+            cache.query('all', 'SELECT * FROM products WHERE name MATCH ?', ['b']),
+        ]);
+        const rows = await cache.query('all', 'SELECT * FROM products WHERE name MATCH ?', ['c']);
+
+        expect(rows).toEqual([{ sql: 'SELECT * FROM products WHERE name MATCH ?', params: ['c'] }]);
+        expect(db.prepared).toHaveLength(1);
+        expect(lookups).toEqual([false, true, true]);
+        expect(cache.stats()).toEqual({ entries: 1, hits: 2, misses: 1 });
+    });
+
+    it('should reset statements after get() so no read snapshot stays open', async () => {
+        const db = fakeDb();
+        const cache = createStatementCache(db);
+        const row = await new Promise((resolve, reject) => {
+            cache.get('SELECT 1', [], (err, result) => (err ? reject(err) : resolve(result)));
+        });
+
+        expect(row).toEqual({ sql: 'SELECT 1', params: [] });
+        expect(db.resets).toBe(1);
+    });
+
+    it('should finalize the least recently used statement past maxEntries', async () => {
+        const db = fakeDb();
+        const cache = createStatementCache(db, { maxEntries: 2 });
+        await cache.query('all', 'SELECT 1');
+        await cache.query('all', 'SELECT 2');
+        await cache.query('all', 'SELECT 1');
+        await cache.query('all', 'SELECT 3');
+        await new Promise((resolve) => setImmediate(resolve));
+
+        expect(db.finalized).toEqual(['SELECT 2']);
+        expect(cache.stats().entries).toBe(2);
+    });
+
+    it('should not keep statements that failed to prepare', async () => {
+        const db = fakeDb();
+        const cache = createStatementCache(db);
+        await expect(cache.query('all', 'BAD SQL')).rejects.toThrow('syntax error');
+        expect(cache.stats().entries).toBe(0);
+    });
+});
@@ -0,0 +1,80 @@
+const stock = require('../src/search/stock');
+
+describe('Warehouse stock', () => {
+    describe('isWarehouse', () => {
+        it('should accept warehouse codes', () => {
+            expect(stock.isWarehouse('bg1')).toBe(true);
+            expect(stock.isWarehouse('BG-2')).toBe(true);
+        });
+
+        it('should reject anything else', () => {
+            expect(stock.isWarehouse('')).toBe(false);
+            expect(stock.isWarehouse("bg1' OR 1=1")).toBe(false);
+            expect(stock.isWarehouse(['bg1'])).toBe(false);
+            expect(stock.isWarehouse(undefined)).toBe(false);
+        });
+    });
+
+    describe('createIndexesSql', () => {
+        it('should keep index names independent of the staging table name', () => {
+            expect(stock.createIndexesSql('warehouse_stock_staging', '_alt')).toEqual([
+                'CREATE INDEX IF NOT EXISTS idx_warehouse_stock_quantity_alt ON warehouse_stock_staging(warehouse, quantity)',
+            ]);
+        });
+    });
+
+    describe('productCondition', () => {
+        it('should restrict products to those with matching stock', () => {
+            expect(stock.productCondition({ warehouse: 'bg1', minQty: 2 })).toEqual({
+                sql: 'p.id IN (SELECT s.product_id FROM warehouse_stock s WHERE s.warehouse = ? AND s.quantity >= ?)',
+                params: ['bg1', 2],
+            });
+        });
+    });
+
+    describe('filterInStock', () => {
+        const capture = () => {
+            const calls = [];
+            const db = {
+                all: (sql, params, cb) => {
+                    calls.push({ sql, params });
+                    cb(null, [{ product_id: 2 }]);
+                },
+            };
+            return { db, calls };
+        };
+
+        it('should check the given products against one warehouse and quantity', async () => {
+            const { db, calls } = capture();
+            const ids = await stock.filterInStock(db, [1, 2], { warehouse: 'bg1', minQty: 3 });
+
+            expect([...ids]).toEqual([2]);
+            expect(calls[0].sql).toMatch(/s\.warehouse = \? AND s\.quantity >= \?/);
+            expect(calls[0].params).toEqual(['[1,2]', 'bg1', 3]);
+        });
+
+        it('should default to any warehouse with stock above zero', async () => {
+            const { db, calls } = capture();
+            await stock.filterInStock(db, [5], {});
+
+            expect(calls[0].sql).toMatch(/s\.quantity > 0/);
+            expect(calls[0].sql).not.toMatch(/s\.warehouse/);
+            expect(calls[0].params).toEqual(['[5]']);
+        });
+
+        it('should use one statement text whatever the number of products', async () => {
+            const { db, calls } = capture();
+            await stock.filterInStock(db, [1], { warehouse: 'bg1' });
+            await stock.filterInStock(db, [1, 2, 3, 4], { warehouse: 'bg1' });
+
+            expect(calls[0].sql).toBe(calls[1].sql);
+            expect(calls[0].sql).toMatch(/json_each\(\?\)/);
+        });
+
+        it('should not query for an empty result set', async () => {
+            const { db, calls } = capture();
+            expect((await stock.filterInStock(db, [], { warehouse: 'bg1' })).size).toBe(0);
+            expect(calls).toHaveLength(0);
+        });
+    });
+});
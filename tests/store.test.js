@@ -0,0 +1,311 @@
+const { createLru } = require('../src/cache/lru');
+const { createCodec } = require('../src/cache/codec');
+const { NEGATIVE_SENTINEL, createCacheStore } = require('../src/cache/store');
+
+const CONFIG = {
+    PREFIX: 'test:',
+    DEFAULT_TTL: 300,
+    HARD_TTL: 1800,
+    NEGATIVE_TTL: 60,
+    LOCAL: { TTL: 60 },
+    GENERATION_KEY: 'catalog:generation',
+    QUERY_STATS_KEY: 'stats:queries',
+    INVALIDATE_BATCH_SIZE: 500,
+    WARM: { MAX_TRACKED_QUERIES: 3, TRIM_EVERY: 2 },
+    CATEGORIES: { SEARCH: 'search:', PRODUCT_REFS: 'refs:' },
+};
+
+// The string, buffer, set and sorted set commands the store uses, kept in Maps. Every
+// command, and a pipeline's exec(), rejects while `down` is set.
+function fakeRedis() {
+    const values = new Map();
+    const sets = new Map();
+    const zsets = new Map();
+    const ttls = new Map();
+    const redis = {
+        values, sets, zsets, ttls, down: false,
+    };
+    // Members of a sorted set from the lowest rank, as Redis orders them
+    const ranked = (key) => [...(zsets.get(key) || new Map())]
+        .sort(([a, scoreA], [b, scoreB]) => scoreA - scoreB || (a < b ? -1 : 1))
+        .map(([member]) => member);
+    // Members between two ranks, inclusive; negative ranks count back from the
+    // end, and a stop before the start selects nothing
+    const range = (members, start, stop) => {
+        const from = Math.max(start < 0 ? members.length + start : start, 0);
+        const to = stop < 0 ? members.length + stop : stop;
+        return to < from ? [] : members.slice(from, to + 1);
+    };
+    const command = (fn) => async (...args) => {
+        if (redis.down) throw new Error('Connection is closed.');
+        return fn(...args);
+    };
+
+    Object.assign(redis, {
+        get: command((key) => (values.has(key) ? String(values.get(key)) : null)),
+        getBuffer: command((key) => (values.has(key) ? Buffer.from(values.get(key)) : null)),
+        set: command((key, value) => {
+            values.set(key, String(value));
+            ttls.delete(key);
+            return 'OK';
+        }),
+        setex: command((key, ttl, value) => {
+            values.set(key, value);
+            ttls.set(key, ttl);
+            return 'OK';
+        }),
+        incr: command((key) => {
+            const next = (parseInt(values.get(key), 10) || 0) + 1;
+            values.set(key, String(next));
+            return next;
+        }),
+        del: command((...keys) => keys.filter((key) => (
+            [values, sets, zsets].map((map) => map.delete(key)).some(Boolean)
+        )).length),
+        sadd: command((key, ...members) => {
+            if (!sets.has(key)) sets.set(key, new Set());
+            const set = sets.get(key);
+            const added = members.filter((member) => !set.has(member));
+            added.forEach((member) => set.add(member));
+            return added.length;
+        }),
+        expire: command((key, ttl) => {
+            ttls.set(key, ttl);
+            return 1;
+        }),
+        sunion: command((...keys) => [...new Set(keys.flatMap((key) => [...(sets.get(key) || [])]))]),
+        zincrby: command((key, increment, member) => {
+            if (!zsets.has(key)) zsets.set(key, new Map());
+            const zset = zsets.get(key);
+            zset.set(member, (zset.get(member) || 0) + increment);
+            return String(zset.get(member));
+        }),
+        zremrangebyrank: command((key, start, stop) => {
+            const removed = range(ranked(key), start, stop);
+            removed.forEach((member) => zsets.get(key).delete(member));
+            return removed.length;
+        }),
+        zrevrange: command((key, start, stop) => range(ranked(key).reverse(), start, stop)),
+        pipeline() {
+            const queued = [];
+            const pipeline = {
+                exec: command(() => Promise.all(queued.map(([name, args]) => (
+                    redis[name](...args).then((result) => [null, result])
+                )))),
+            };
+            ['sadd', 'expire', 'zincrby', 'zremrangebyrank'].forEach((name) => {
+                pipeline[name] = (...args) => {
+                    queued.push([name, args]);
+                    return pipeline;
+                };
+            });
+            return pipeline;
+        },
+    });
+    return redis;
+}
+
+const createLocalCache = () => createLru({ maxEntries: 100, maxBytes: 1024 * 1024 });
+
+// A store as one server process holds it, sharing `redis` with others
+const createStore = (redis, localCache = createLocalCache()) => createCacheStore({
+    redis,
+    config: CONFIG,
+    localCache,
+    codec: createCodec({ name: 'gzip' }),
+});
+
+describe('Cache store', () => {
+    let redis;
+
+    beforeEach(() => {
+        redis = fakeRedis();
+    });
+
+    describe('negative entries', () => {
+        it('should store empty results as the sentinel with the negative TTL', async () => {
+            const store = createStore(redis);
+            await store.set('test:search:g0:typo', []);
+
+            expect(redis.values.get('test:search:g0:typo').equals(NEGATIVE_SENTINEL)).toBe(true);
+            expect(redis.ttls.get('test:search:g0:typo')).toBe(CONFIG.NEGATIVE_TTL);
+        });
+
+        it('should read the sentinel back as a fresh empty result', async () => {
+            await createStore(redis).set('test:search:g0:typo', []);
+
+            // Another process, with nothing in its local tier
+            const other = createStore(redis);
+            const entry = await other.getEntry('test:search:g0:typo');
+            expect(entry.stale).toBe(false);
+            expect(entry.buffer.toString()).toBe('[]');
+            expect(await other.get('test:search:g0:typo')).toEqual([]);
+        });
+    });
+
+    describe('entries', () => {
+        it('should keep results in Redis until the hard TTL and serve them fresh until the soft one', async () => {
+            const rows = [{ id: 1, name: 'Blue Test Shirt' }];
+            await createStore(redis).set('test:search:g0:blue', rows, 120);
+
+            expect(redis.ttls.get('test:search:g0:blue')).toBe(CONFIG.HARD_TTL);
+            const entry = await createStore(redis).getEntry('test:search:g0:blue');
+            expect(entry.stale).toBe(false);
+            expect(JSON.parse(entry.buffer.toString())).toEqual(rows);
+        });
+
+        it('should report entries past the soft TTL as stale', async () => {
+            await createStore(redis).set('test:search:g0:blue', [{ id: 1 }], -1);
+
+            const entry = await createStore(redis).getEntry('test:search:g0:blue');
+            expect(entry.stale).toBe(true);
+            expect(JSON.parse(entry.buffer.toString())).toEqual([{ id: 1 }]);
+        });
+
+        it('should treat Redis errors as misses', async () => {
+            const store = createStore(redis);
+            redis.down = true;
+            await store.set('test:search:g0:blue', [{ id: 1 }]);
+
+            expect(await createStore(redis).getEntry('test:search:g0:blue')).toBeNull();
+        });
+    });
+
+    describe('catalog generations', () => {
+        it('should put the generation in every key and move it on each bump', async () => {
+            const store = createStore(redis);
+            expect(store.generateKey('search:', 'blue')).toBe('test:search:g0:blue');
+
+            await store.bumpGeneration();
+            expect(store.generateKey('search:', 'blue')).toBe('test:search:g1:blue');
+            expect(redis.values.get('test:catalog:generation')).toBe('1');
+        });
+
+        it('should drop the local tier on a bump', async () => {
+            const store = createStore(redis);
+            await store.set('test:search:g0:blue', [{ id: 1 }]);
+            redis.values.clear();
+
+            await store.bumpGeneration();
+            expect(await store.getEntry('test:search:g0:blue')).toBeNull();
+        });
+
+        it('should load the generation another process bumped', async () => {
+            await createStore(redis).bumpGeneration();
+            await createStore(redis).bumpGeneration();
+
+            const store = createStore(redis);
+            await store.loadGeneration();
+            expect(store.generation()).toBe(2);
+        });
+
+        it('should never reuse a generation after a failed INCR', async () => {
+            const store = createStore(redis);
+            await store.bumpGeneration(); // 1, in Redis too
+
+            redis.down = true;
+            await store.bumpGeneration();
+            expect(store.generation()).toBe(2);
+
+            // Redis still says 1, so INCR returns the generation already in use
+            redis.down = false;
+            await store.bumpGeneration();
+            expect(store.generation()).toBe(3);
+            expect(redis.values.get('test:catalog:generation')).toBe('3');
+        });
+
+        it('should write a local generation ahead of Redis back on load', async () => {
+            const store = createStore(redis);
+            redis.down = true;
+            await store.bumpGeneration();
+
+            redis.down = false;
+            await store.loadGeneration();
+            expect(store.generation()).toBe(1);
+            expect(redis.values.get('test:catalog:generation')).toBe('1');
+
+            redis.values.set('test:catalog:generation', '5');
+            await store.loadGeneration();
+            expect(store.generation()).toBe(5);
+        });
+    });
+
+    describe('product references', () => {
+        const searches = {
+            'test:search:g0:blue': [{ id: 1 }, { id: 2 }],
+            'test:search:g0:shirt': [{ id: 2 }],
+            'test:search:g0:red': [{ id: 3 }],
+        };
+        let localCache;
+        let store;
+
+        beforeEach(async () => {
+            localCache = createLocalCache();
+            store = createStore(redis, localCache);
+            await Promise.all(Object.entries(searches).map(async ([key, rows]) => {
+                await store.set(key, rows);
+                await store.trackProducts(key, rows);
+            }));
+        });
+
+        it('should record the searches holding each product, expiring with them', () => {
+            const refs = [...redis.sets.get('test:refs:g0:2')].sort();
+            expect(refs).toEqual(['test:search:g0:blue', 'test:search:g0:shirt']);
+            expect(redis.ttls.get('test:refs:g0:2')).toBe(CONFIG.HARD_TTL);
+        });
+
+        it('should drop exactly the searches holding a changed product from both tiers', async () => {
+            expect(await store.invalidateProducts([2])).toBe(2);
+
+            ['test:search:g0:blue', 'test:search:g0:shirt'].forEach((key) => {
+                expect(redis.values.has(key)).toBe(false);
+                expect(localCache.get(key)).toBeNull();
+            });
+            expect(redis.sets.has('test:refs:g0:2')).toBe(false);
+
+            expect(redis.values.has('test:search:g0:red')).toBe(true);
+            expect(localCache.get('test:search:g0:red').toString()).toBe('[{"id":3}]');
+            expect(await createStore(redis).get('test:search:g0:red')).toEqual([{ id: 3 }]);
+        });
+
+        it('should leave the cache alone for products no search holds', async () => {
+            expect(await store.invalidateProducts([99])).toBe(0);
+            expect(Object.keys(searches).every((key) => redis.values.has(key))).toBe(true);
+        });
+    });
+
+    describe('query ranking', () => {
+        const record = async (store, queries) => {
+            // One at a time, like separate requests
+            for (const query of queries) {
+                await store.recordQuery(query);
+            }
+        };
+
+        it('should return the most frequent queries first', async () => {
+            const store = createStore(redis);
+            await record(store, ['blue', 'shirt', 'blue', 'cap', 'blue', 'shirt']);
+
+            expect(await store.topQueries(2)).toEqual(['blue', 'shirt']);
+        });
+
+        it('should trim the ranking to its bound while recording', async () => {
+            const store = createStore(redis);
+            await record(store, ['blue', 'blue', 'shirt', 'shirt', 'blue', 'cap', 'hat', 'sock']);
+
+            expect(redis.zsets.get('test:stats:queries').size).toBe(CONFIG.WARM.MAX_TRACKED_QUERIES);
+            const ranking = await store.topQueries(10);
+            expect(ranking).toHaveLength(CONFIG.WARM.MAX_TRACKED_QUERIES);
+            expect(ranking.slice(0, 2)).toEqual(['blue', 'shirt']);
+        });
+
+        it('should not reject when Redis is down', async () => {
+            const store = createStore(redis);
+            redis.down = true;
+            await store.recordQuery('blue');
+
+            redis.down = false;
+            expect(await store.topQueries(10)).toEqual([]);
+        });
+    });
+});
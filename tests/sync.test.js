@@ -0,0 +1,276 @@
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const sqlite3 = require('sqlite3');
+const productSync = require('../src/sync/products');
+const syncState = require('../src/sync/state');
+
+const log = () => {};
+
+const run = (db, sql, params = []) => new Promise((resolve, reject) => {
+    db.run(sql, params, (err) => (err ? reject(err) : resolve()));
+});
+
+const all = (db, sql, params = []) => new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => (err ? reject(err) : resolve(rows)));
+});
+
+// Schema as initializeDatabase creates it, on a temp file
+async function openCatalog(dir) {
+    const db = new sqlite3.Database(path.join(dir, `catalog-${Date.now()}-${Math.random()}.sqlite`));
+    await run(db, productSync.createTableSql());
+    await productSync.ensureIndexes(db);
+    await run(db, syncState.createTableSql());
+    for (const table of productSync.DERIVED_TABLES) {
+        await run(db, table.createTableSql());
+        if (table.createIndexesSql) await productSync.ensureIndexes(db, table);
+    }
+    return db;
+}
+
+function dkProduct(itemCode, overrides = {}) {
+    return {
+        ItemCode: itemCode,
+        Description: `Item ${itemCode}`,
+        Barcodes: [{ Barcode: `5690000${itemCode.replace(/\D/g, '')}` }],
+        Warehouses: [{ Warehouse: 'bg1', QuantityInStock: 2 }],
+        RecordModified: '2024-01-01T00:00:00',
+        ...overrides,
+    };
+}
+
+const productId = async (db, itemCode) => (
+    await all(db, 'SELECT id FROM products WHERE item_code = ?', [itemCode])
+)[0]?.id;
+
+// Names of tables and indexes in the schema, by type
+const schemaNames = (db, type) => all(
+    db,
+    "SELECT name, tbl_name FROM sqlite_master WHERE type = ? AND name NOT LIKE 'sqlite_%' ORDER BY name",
+    [type],
+);
+
+const ftsMatches = async (db, match) => (
+    await all(db, 'SELECT rowid AS id FROM products_fts WHERE products_fts MATCH ? ORDER BY rowid', [match])
+).map((row) => row.id);
+
+describe('Product sync', () => {
+    describe('toRow', () => {
+        it('should map a DK product to column values', () => {
+            const row = productSync.toRow({
+                ItemCode: 'TEST001',
+                Description: 'Blue',
+                Description2: 'Shirt',
+                Barcodes: [{ Barcode: '1234567890' }],
+                Inactive: true,
+            });
+            const value = (column) => row[productSync.PRODUCT_COLUMNS.indexOf(column)];
+
+            expect(row).toHaveLength(productSync.PRODUCT_COLUMNS.length);
+            expect(value('item_code')).toBe('TEST001');
+            expect(value('name')).toBe('Blue Shirt');
+            expect(value('barcodes')).toBe('["1234567890"]');
+            expect(value('inactive')).toBe(1);
+            expect(value('currency_code')).toBe('ISK');
+        });
+
+        it('should fall back to the item code for the name', () => {
+            const row = productSync.toRow({ ItemCode: 'TEST002' });
+            expect(row[productSync.PRODUCT_COLUMNS.indexOf('name')]).toBe('TEST002');
+        });
+    });
+
+    describe('maxRecordModified', () => {
+        it('should return the latest modification time', () => {
+            const rows = [
+                { RecordModified: '2024-01-02T10:00:00' },
+                { RecordModified: null },
+                { RecordModified: '2024-03-01T08:00:00' },
+            ].map((product) => productSync.toRow({ ItemCode: 'X', ...product }));
+
+            expect(productSync.maxRecordModified(rows)).toBe('2024-03-01T08:00:00');
+            expect(productSync.maxRecordModified([])).toBeNull();
+        });
+    });
+
+    describe('against SQLite', () => {
+        let dir;
+        let db;
+
+        beforeAll(() => {
+            dir = fs.mkdtempSync(path.join(os.tmpdir(), 'ss-sync-'));
+        });
+
+        beforeEach(async () => {
+            db = await openCatalog(dir);
+        });
+
+        afterEach((done) => {
+            db.close(done);
+        });
+
+        afterAll(() => {
+            fs.rmSync(dir, { recursive: true, force: true });
+        });
+
+        describe('storeIncremental', () => {
+            const catalog = [dkProduct('A1'), dkProduct('A2'), dkProduct('A3')];
+
+            it('should load an empty database in full', async () => {
+                const result = await productSync.storeIncremental(db, catalog, log);
+
+                expect(result).toMatchObject({ mode: 'full', inserted: 3 });
+                expect(await all(db, 'SELECT COUNT(*) AS n FROM products')).toEqual([{ n: 3 }]);
+            });
+
+            it('should write only what changed and keep derived tables in step', async () => {
+                await productSync.storeIncremental(db, catalog, log);
+                const changedId = await productId(db, 'A2');
+                const removedId = await productId(db, 'A3');
+
+                const result = await productSync.storeIncremental(db, [
+                    dkProduct('A1'),
+                    dkProduct('A2', {
+                        Description: 'Renamed',
+                        Barcodes: [{ Barcode: '5691111111' }],
+                        Warehouses: [
+                            { Warehouse: 'bg1', QuantityInStock: 7 },
+                            { Warehouse: 'bg2', QuantityInStock: 1 },
+                        ],
+                        RecordModified: '2024-02-01T00:00:00',
+                    }),
+                    dkProduct('A4'),
+                ], log);
+
+                expect(result).toEqual({
+                    mode: 'incremental', inserted: 1, updated: 1, deleted: 1,
+                });
+                expect(await all(db, 'SELECT item_code FROM products ORDER BY item_code'))
+                    .toEqual([{ item_code: 'A1' }, { item_code: 'A2' }, { item_code: 'A4' }]);
+
+                expect(await ftsMatches(db, 'renamed')).toEqual([changedId]);
+                expect(await ftsMatches(db, '"a3"')).toEqual([]);
+                expect(await ftsMatches(db, '"a4"')).toEqual([await productId(db, 'A4')]);
+
+                expect(await all(db, 'SELECT barcode FROM product_barcodes WHERE product_id = ?', [changedId]))
+                    .toEqual([{ barcode: '5691111111' }]);
+                expect(await all(db, 'SELECT * FROM product_barcodes WHERE product_id = ?', [removedId])).toEqual([]);
+
+                expect(await all(
+                    db,
+                    'SELECT warehouse, quantity FROM warehouse_stock WHERE product_id = ? ORDER BY warehouse',
+                    [changedId],
+                )).toEqual([{ warehouse: 'bg1', quantity: 7 }, { warehouse: 'bg2', quantity: 1 }]);
+                expect(await all(db, 'SELECT * FROM warehouse_stock WHERE product_id = ?', [removedId])).toEqual([]);
+
+                expect(await syncState.get(db, syncState.KEYS.MAX_RECORD_MODIFIED)).toBe('2024-02-01T00:00:00');
+            });
+
+            it('should not write anything for an unchanged feed', async () => {
+                await productSync.storeIncremental(db, catalog, log);
+
+                expect(await productSync.storeIncremental(db, catalog, log)).toEqual({
+                    mode: 'incremental', inserted: 0, updated: 0, deleted: 0,
+                });
+            });
+
+            it('should refuse to empty the catalog from an empty feed', async () => {
+                await productSync.storeIncremental(db, catalog, log);
+
+                await expect(productSync.storeIncremental(db, [], log)).rejects.toThrow(/feed is empty/);
+                expect(await all(db, 'SELECT COUNT(*) AS n FROM products')).toEqual([{ n: 3 }]);
+                expect(await all(db, 'SELECT COUNT(*) AS n FROM warehouse_stock')).toEqual([{ n: 3 }]);
+            });
+        });
+
+        describe('storeFull', () => {
+            const indexesOn = async (table) => (await schemaNames(db, 'index'))
+                .filter((index) => index.tbl_name === table)
+                .map((index) => index.name);
+
+            it('should swap in staged tables with alternating index names', async () => {
+                // Leftovers of an interrupted sync
+                await run(db, 'CREATE TABLE products_staging (id INTEGER)');
+                await run(db, 'CREATE TABLE warehouse_stock_old (id INTEGER)');
+
+                expect(await productSync.storeFull(db, [dkProduct('A1'), dkProduct('A2')], log)).toEqual({
+                    mode: 'full', inserted: 2, updated: 0, deleted: 0,
+                });
+                expect(await indexesOn('products')).toEqual(
+                    ['idx_barcodes_alt', 'idx_categories_alt', 'idx_item_code_alt', 'idx_name_alt'],
+                );
+                expect(await indexesOn('warehouse_stock')).toEqual(['idx_warehouse_stock_quantity_alt']);
+
+                const feed = [dkProduct('B1', { RecordModified: '2024-05-01' })];
+                expect(await productSync.storeFull(db, feed, log)).toMatchObject({ mode: 'full', inserted: 1 });
+                expect(await indexesOn('products')).toEqual(
+                    ['idx_barcodes', 'idx_categories', 'idx_item_code', 'idx_name'],
+                );
+                expect(await indexesOn('warehouse_stock')).toEqual(['idx_warehouse_stock_quantity']);
+
+                const tables = (await schemaNames(db, 'table')).map((table) => table.name);
+                expect(tables).toEqual(expect.arrayContaining([
+                    'products', 'products_fts', 'products_trigram', 'product_barcodes', 'warehouse_stock',
+                ]));
+                expect(tables.filter((name) => /_(staging|old)(_|$)/.test(name))).toEqual([]);
+
+                const id = await productId(db, 'B1');
+                expect(await all(db, 'SELECT item_code FROM products')).toEqual([{ item_code: 'B1' }]);
+                expect(await ftsMatches(db, '"b1"')).toEqual([id]);
+                expect(await ftsMatches(db, '"a1"')).toEqual([]);
+                expect(await all(db, 'SELECT product_id FROM product_barcodes')).toEqual([{ product_id: id }]);
+                expect(await all(db, 'SELECT product_id, quantity FROM warehouse_stock'))
+                    .toEqual([{ product_id: id, quantity: 2 }]);
+                expect(await syncState.get(db, syncState.KEYS.MAX_RECORD_MODIFIED)).toBe('2024-05-01');
+            });
+
+            it('should keep product ids across full syncs and never reuse one', async () => {
+                await productSync.storeFull(db, ['A1', 'A2', 'A3', 'A4'].map((code) => dkProduct(code)), log);
+                const a4 = await productId(db, 'A4');
+
+                await productSync.storeFull(db, [dkProduct('A1'), dkProduct('A4'), dkProduct('B1')], log);
+                expect(await all(db, 'SELECT id, item_code FROM products ORDER BY id')).toEqual([
+                    { id: 1, item_code: 'A1' },
+                    { id: a4, item_code: 'A4' },
+                    { id: a4 + 1, item_code: 'B1' },
+                ]);
+                expect(await all(db, 'SELECT product_id FROM warehouse_stock ORDER BY product_id'))
+                    .toEqual([{ product_id: 1 }, { product_id: a4 }, { product_id: a4 + 1 }]);
+            });
+        });
+
+        describe('storeStock', () => {
+            it('should rewrite only warehouse data for changed products', async () => {
+                await productSync.storeFull(db, [dkProduct('A1'), dkProduct('A2')], log);
+                const id = await productId(db, 'A2');
+                const [before] = await all(db, 'SELECT * FROM products WHERE item_code = ?', ['A2']);
+
+                const warehouses = [{ Warehouse: 'bg1', QuantityInStock: 0 }, { Warehouse: 'bg2', QuantityInStock: 4 }];
+                const result = await productSync.storeStock(db, [
+                    { ItemCode: 'A1', Warehouses: dkProduct('A1').Warehouses },
+                    { ItemCode: 'A2', Warehouses: warehouses, Description: 'Ignored' },
+                    { ItemCode: 'NEW', Warehouses: warehouses },
+                ], log);
+
+                const data = JSON.stringify(warehouses);
+                expect(result).toEqual({
+                    mode: 'stock', inserted: 0, updated: 1, deleted: 0, changes: [{ id, warehouse_data: data }],
+                });
+
+                const [after] = await all(db, 'SELECT * FROM products WHERE item_code = ?', ['A2']);
+                expect(after).toEqual({ ...before, warehouse_data: data });
+                expect(await productId(db, 'NEW')).toBeUndefined();
+                expect(await ftsMatches(db, 'ignored')).toEqual([]);
+
+                expect(await all(
+                    db,
+                    'SELECT product_id, warehouse, quantity FROM warehouse_stock ORDER BY product_id, warehouse',
+                )).toEqual([
+                    { product_id: await productId(db, 'A1'), warehouse: 'bg1', quantity: 2 },
+                    { product_id: id, warehouse: 'bg1', quantity: 0 },
+                    { product_id: id, warehouse: 'bg2', quantity: 4 },
+                ]);
+            });
+        });
+    });
+});
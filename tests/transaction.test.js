@@ -0,0 +1,53 @@
+const sqlite3 = require('sqlite3');
+const { runTransaction, runStatements } = require('../src/db/transaction');
+
+describe('SQLite transactions', () => {
+    let db;
+
+    const count = () => new Promise((resolve, reject) => {
+        db.get('SELECT COUNT(*) AS n FROM items', [], (err, row) => (err ? reject(err) : resolve(row.n)));
+    });
+
+    beforeEach((done) => {
+        db = new sqlite3.Database(':memory:');
+        db.run('CREATE TABLE items (id INTEGER PRIMARY KEY)', done);
+    });
+
+    afterEach((done) => {
+        db.close(done);
+    });
+
+    it('should commit when every statement succeeds', async () => {
+        await runStatements(db, ['INSERT INTO items VALUES (1)', 'INSERT INTO items VALUES (2)']);
+        expect(await count()).toBe(2);
+    });
+
+    it('should roll back and reject with the first error', async () => {
+        await expect(runStatements(db, [
+            'INSERT INTO items VALUES (1)',
+            'INSERT INTO missing VALUES (1)',
+            'INSERT INTO items VALUES (2)',
+        ])).rejects.toThrow(/no such table: missing/);
+        expect(await count()).toBe(0);
+    });
+
+    it('should pass track to statements with parameters', async () => {
+        await expect(runTransaction(db, (track) => {
+            db.run('INSERT INTO items VALUES (?)', [1], track);
+            db.run('INSERT INTO items VALUES (?)', [1], track);
+        })).rejects.toThrow(/UNIQUE constraint failed/);
+        expect(await count()).toBe(0);
+    });
+
+    it('should run concurrent transactions on one connection one after another', async () => {
+        const results = await Promise.allSettled([
+            runStatements(db, ['INSERT INTO items VALUES (1)', 'INSERT INTO items VALUES (2)']),
+            runStatements(db, ['INSERT INTO items VALUES (3)', 'INSERT INTO missing VALUES (1)']),
+            runStatements(db, ['INSERT INTO items VALUES (4)']),
+        ]);
+
+        expect(results.map(({ status }) => status)).toEqual(['fulfilled', 'rejected', 'fulfilled']);
+        expect(results[1].reason.message).toMatch(/no such table: missing/);
+        expect(await count()).toBe(3);
+    });
+});
@@ -0,0 +1,16 @@
+const trigram = require('../src/search/trigram');
+
+describe('Trigram search', () => {
+    describe('buildMatchExpression', () => {
+        it('should match every term as a substring', () => {
+            expect(trigram.buildMatchExpression('56789')).toBe('"56789"');
+            expect(trigram.buildMatchExpression('b-12 901')).toBe('"b-12" AND "901"');
+        });
+
+        it('should return null when any term is shorter than a trigram', () => {
+            expect(trigram.buildMatchExpression('12')).toBeNull();
+            expect(trigram.buildMatchExpression('abc de')).toBeNull();
+            expect(trigram.buildMatchExpression('   ')).toBeNull();
+        });
+    });
+});
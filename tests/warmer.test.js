@@ -0,0 +1,71 @@
+const { createCacheWarmer } = require('../src/cache/warmer');
+
+// A store whose ranking is a fixed list, most frequent first
+const fakeStore = (ranking) => ({
+    limits: [],
+    async topQueries(limit) {
+        this.limits.push(limit);
+        return ranking.slice(0, limit);
+    },
+});
+
+describe('Cache warmer', () => {
+    it('should refresh the top queries one at a time, most frequent first', async () => {
+        const store = fakeStore(['blue', 'shirt', 'cap']);
+        const refreshed = [];
+        let running = 0;
+        const warmer = createCacheWarmer({
+            store,
+            topQueries: 2,
+            refresh: async (query) => {
+                running += 1;
+                expect(running).toBe(1);
+                await new Promise((resolve) => setTimeout(resolve, 5));
+                refreshed.push(query);
+                running -= 1;
+            },
+        });
+
+        expect(await warmer.warm()).toBe(2);
+        expect(store.limits).toEqual([2]);
+        expect(refreshed).toEqual(['blue', 'shirt']);
+    });
+
+    it('should skip a warm requested while one is running', async () => {
+        const store = fakeStore(['blue']);
+        let refreshes = 0;
+        const warmer = createCacheWarmer({
+            store,
+            topQueries: 10,
+            refresh: async () => {
+                refreshes += 1;
+            },
+        });
+
+        const results = await Promise.all([warmer.warm(), warmer.warm()]);
+        expect(results).toEqual([1, 0]);
+        expect(refreshes).toBe(1);
+
+        expect(await warmer.warm()).toBe(1);
+        expect(warmer.isWarming()).toBe(false);
+    });
+
+    it('should log a failed warm and allow the next one', async () => {
+        const logged = [];
+        let fail = true;
+        const warmer = createCacheWarmer({
+            store: fakeStore(['blue']),
+            topQueries: 10,
+            refresh: async () => {
+                if (fail) throw new Error('Database error');
+            },
+            log: (level, message) => logged.push([level, message]),
+        });
+
+        expect(await warmer.warm()).toBe(0);
+        expect(logged).toEqual([['error', 'Error warming search cache:']]);
+
+        fail = false;
+        expect(await warmer.warm()).toBe(1);
+    });
+});